@@ -0,0 +1,182 @@
+"""Generate synthetic dso projects for benchmarking
+
+The generated projects mimic the structure of real-world projects: a tree of folders, each of which can have
+a `params.in.yaml` that overrides parameters of its parent, and stages in the leaf folders that come with a
+`params.in.yaml`, `dvc.yaml`, a quarto document and a README.
+
+Usage::
+
+    python benchmarks/generate_project.py /tmp/bench_project --depth 3 --fan-out 4 --stages 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import subprocess
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from textwrap import dedent
+
+import yaml
+
+
+@dataclass
+class ProjectSpec:
+    """Parameters of a synthetic project"""
+
+    depth: int = 2
+    """Number of folder levels between the project root and the stages"""
+
+    fan_out: int = 3
+    """Number of subfolders in each folder"""
+
+    stages: int = 5
+    """Number of stages in each leaf folder"""
+
+    n_params: int = 50
+    """Number of parameters in the root `params.in.yaml`. Folders and stages define a fraction of this."""
+
+    path_density: float = 0.2
+    """Fraction of stage parameters that are `!path` objects. Half of them point to files that don't exist."""
+
+    matrix_stages: float = 0.1
+    """Fraction of stages that are matrix stages in `dvc.yaml`"""
+
+    ignored_files: int = 0
+    """Number of files in a .gitignored data directory at the project root (e.g. raw data or dvc outputs)"""
+
+    seed: int = 0
+    """Seed of the random number generator"""
+
+
+PRESETS = {
+    "small": ProjectSpec(depth=1, fan_out=2, stages=3, n_params=20),
+    "medium": ProjectSpec(depth=2, fan_out=3, stages=5, n_params=50, ignored_files=1000),
+    "large": ProjectSpec(depth=3, fan_out=4, stages=8, n_params=200, ignored_files=20000),
+}
+"""Predefined project sizes"""
+
+
+def _yaml_value(rng: random.Random, i: int) -> str:
+    """Generate a random YAML value with a mix of scalars, lists and nested mappings"""
+    kind = rng.randrange(4)
+    if kind == 0:
+        return str(rng.randrange(1000))
+    elif kind == 1:
+        return f'"value_{i}_{rng.randrange(1000)}"'
+    elif kind == 2:
+        return "[" + ", ".join(str(rng.randrange(100)) for _ in range(5)) + "]"
+    else:
+        return "{" + ", ".join(f"k{j}: {rng.random():.4f}" for j in range(4)) + "}"
+
+
+def _write(path: Path, content: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def _generate_stage(root: Path, stage: Path, spec: ProjectSpec, rng: random.Random, index: int):
+    stage_rel = stage.relative_to(root)
+    n_params = max(spec.n_params // 5, 1)
+    lines = ["# stage parameters", f"stage_name: {stage.name}", 'derived: "{{ param_0 }}_{{ stage_name }}"']
+    path_params = []
+    for i in range(n_params):
+        if rng.random() < spec.path_density:
+            exists = i % 2 == 0
+            target = f"data/{stage.name}_{i}.csv" if exists else f"output/{stage.name}_{i}.csv"
+            if exists:
+                _write(stage / target, "a,b\n1,2\n")
+            lines.append(f"path_{i}: !path {target}")
+            path_params.append(f"path_{i}")
+        else:
+            lines.append(f"stage_param_{i}: {_yaml_value(rng, i)}")
+    _write(stage / "params.in.yaml", "\n".join(lines) + "\n")
+
+    is_matrix = rng.random() < spec.matrix_stages
+    deps = [f"src/{stage.name}.qmd", *(f"${{ {p} }}" for p in path_params[:3])]
+    dvc_stage = {
+        "cmd": "dso exec quarto ." + (" --seed ${ item.seed }" if is_matrix else ""),
+        "params": ["dso.quarto", "stage_name", "derived", *(f"stage_param_{i}" for i in range(0, n_params, 7))],
+        "deps": deps,
+        "outs": ["report/" + stage.name + (".${ item.seed }" if is_matrix else "") + ".html"],
+    }
+    if is_matrix:
+        dvc_stage = {"matrix": {"seed": [1, 2, 3]}, **dvc_stage}
+    _write(stage / "dvc.yaml", yaml.safe_dump({"stages": {stage.name: dvc_stage}}, sort_keys=False))
+    _write(
+        stage / "src" / f"{stage.name}.qmd",
+        dedent(
+            f"""\
+            ---
+            title: "{stage.name}"
+            ---
+
+            ```{{r}}
+            params <- dso::read_params("{stage_rel}")
+            ```
+            """
+        ),
+    )
+    _write(stage / "README.md", f"# {stage.name}\n\nStage {index} of the synthetic project, see `{stage_rel}`.\n")
+
+
+def _generate_folder(root: Path, folder: Path, level: int, spec: ProjectSpec, rng: random.Random) -> int:
+    """Recursively generate folders and stages, returns the number of generated stages"""
+    if folder != root:
+        lines = [f"folder_name: {folder.name}"]
+        lines += [f"param_{i}: {_yaml_value(rng, i)}" for i in range(0, spec.n_params, 10)]
+        _write(folder / "params.in.yaml", "\n".join(lines) + "\n")
+        _write(folder / "dvc.yaml", "stages: {}\n")
+        _write(folder / "README.md", f"# {folder.name}\n")
+    if level == spec.depth:
+        for i in range(spec.stages):
+            _generate_stage(root, folder / f"{i + 1:02d}_stage_{i + 1}", spec, rng, i)
+        return spec.stages
+    return sum(
+        _generate_folder(root, folder / f"{i + 1:02d}_folder_{i + 1}", level + 1, spec, rng)
+        for i in range(spec.fan_out)
+    )
+
+
+def generate_project(path: Path, spec: ProjectSpec) -> dict:
+    """
+    Generate a synthetic dso project in `path`
+
+    The directory is initialized as a git repository, but no files are committed.
+
+    Returns
+    -------
+    A dictionary with the specification and statistics of the generated project
+    """
+    rng = random.Random(spec.seed)
+    path.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["git", "init", "-q"], cwd=path, check=True)
+    _write(path / ".gitignore", "params.yaml\n.dso.json\n/ignored/\n")
+    _write(path / "pyproject.toml", "[tool.dso]\nuse_relative_paths = true\n")
+    _write(path / "dvc.yaml", "stages: {}\n")
+    root_params = ["# root parameters", "dso:", "  quarto:", "    author: benchmark"]
+    root_params += [f"param_{i}: {_yaml_value(rng, i)}" for i in range(spec.n_params)]
+    _write(path / "params.in.yaml", "\n".join(root_params) + "\n")
+    for i in range(spec.ignored_files):
+        _write(path / "ignored" / f"{i // 1000:03d}" / f"file_{i}.txt", "x\n")
+    n_stages = _generate_folder(path, path, 0, spec, rng)
+    return {**asdict(spec), "n_stages": n_stages, "n_configs": len(list(path.glob("**/params.in.yaml")))}
+
+
+def main():
+    """Command line interface of the project generator"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path, help="Directory in which the project is generated")
+    parser.add_argument("--preset", choices=list(PRESETS), default="medium", help="Start from a predefined size")
+    for field, default in asdict(ProjectSpec()).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(default), default=None)
+    args = parser.parse_args()
+    spec = PRESETS[args.preset]
+    spec = ProjectSpec(**{k: v if (v := getattr(args, k)) is not None else d for k, d in asdict(spec).items()})
+    print(json.dumps(generate_project(args.path, spec), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""Run the dso benchmark suite
+
+Generates a synthetic project (see `generate_project.py`), times the most performance-relevant operations of dso
+and writes the results to a JSON file. Pass the results of a previous run with `--compare` to detect regressions,
+e.g. before rolling out a new version of dso.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py --preset medium --output results.json
+    python benchmarks/run_benchmarks.py --preset medium --compare results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import asdict
+from datetime import UTC, datetime
+from pathlib import Path
+
+from generate_project import PRESETS, ProjectSpec, generate_project
+
+RESULTS_SCHEMA_VERSION = 1
+"""Version of the format of the JSON results file"""
+
+BENCHMARKS: dict[str, Callable[[BenchmarkContext], None]] = {}
+"""All registered benchmarks, see :func:`benchmark`"""
+
+
+class BenchmarkContext:
+    """
+    State shared by all benchmarks
+
+    Parameters
+    ----------
+    template
+        A generated project that is never modified. Benchmarks that modify the project work on copies.
+    workdir
+        A scratch directory
+    """
+
+    def __init__(self, template: Path, workdir: Path, repeat: int):
+        self.template = template
+        self.workdir = workdir
+        self.repeat = repeat
+        self.results: dict[str, dict] = {}
+
+    def fresh_project(self) -> Path:
+        """Get a pristine copy of the generated project"""
+        dest = Path(tempfile.mkdtemp(dir=self.workdir)) / "project"
+        shutil.copytree(self.template, dest, symlinks=True)
+        return dest
+
+    def stages(self, project: Path) -> list[Path]:
+        """All stages of a project, sorted by path"""
+        return sorted(p.parent.parent for p in project.glob("**/src/*.qmd"))
+
+    def time(self, name: str, fn: Callable[[], object], setup: Callable[[], object] | None = None):
+        """
+        Time `fn` `repeat` times and record the results under `name`
+
+        `setup` is called (untimed) before each repetition.
+        """
+        times = []
+        for _ in range(self.repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        self.results[name] = {
+            "times": times,
+            "min": min(times),
+            "median": statistics.median(times),
+            "mean": statistics.fmean(times),
+        }
+        print(f"{name:<40} min {min(times):9.4f}s  median {statistics.median(times):9.4f}s", file=sys.stderr)
+
+
+def benchmark(fn: Callable[[BenchmarkContext], None]):
+    """Register a benchmark. Each benchmark can record one or multiple timings using :meth:`BenchmarkContext.time`."""
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+@contextlib.contextmanager
+def _chdir(path: Path):
+    old = Path.cwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+
+def _clear_caches():
+    """Clear in-process caches of dso, such that timings are comparable across repetitions"""
+    from dso._util import _find_in_parent_abs, get_dso_config_from_pyproject_toml
+
+    _find_in_parent_abs.cache_clear()
+    get_dso_config_from_pyproject_toml.cache_clear()
+
+
+@benchmark
+def compile_config(ctx: BenchmarkContext):
+    """`compile_all_configs` for the entire project and a single stage"""
+    from dso._compile_config import compile_all_configs
+
+    project = ctx.fresh_project()
+    stage = ctx.stages(project)[-1]
+
+    def _clean():
+        _clear_caches()
+        shutil.rmtree(project / ".dso", ignore_errors=True)
+        for p in project.glob("**/params.yaml"):
+            p.unlink()
+
+    ctx.time("compile_config.all.cold", lambda: compile_all_configs([project]), setup=_clean)
+    ctx.time("compile_config.all.force", lambda: compile_all_configs([project], force=True), setup=_clear_caches)
+    ctx.time("compile_config.all.noop", lambda: compile_all_configs([project]), setup=_clear_caches)
+    ctx.time("compile_config.stage.cold", lambda: compile_all_configs([stage]), setup=_clean)
+    ctx.time("compile_config.stage.noop", lambda: compile_all_configs([stage]), setup=_clear_caches)
+
+
+@benchmark
+def get_config(ctx: BenchmarkContext):
+    """`get_config` for a single stage, with and without compiling"""
+    from dso._compile_config import compile_all_configs
+    from dso._get_config import get_config
+
+    project = ctx.fresh_project()
+    stage = str(ctx.stages(project)[-1].relative_to(project))
+    compile_all_configs([project])
+    with _chdir(project):
+        ctx.time("get_config.compile", lambda: get_config(stage), setup=_clear_caches)
+        ctx.time("get_config.skip_compile", lambda: get_config(stage, skip_compile=True), setup=_clear_caches)
+        ctx.time("get_config.all", lambda: get_config(stage, all=True, skip_compile=True), setup=_clear_caches)
+
+
+@benchmark
+def lint(ctx: BenchmarkContext):
+    """Linting the entire project"""
+    from dso._compile_config import compile_all_configs
+    from dso._lint import lint
+
+    project = ctx.fresh_project()
+    # linting requires compiled configs
+    compile_all_configs([project])
+
+    def _lint():
+        with _chdir(project), contextlib.suppress(SystemExit):
+            lint([project])
+
+    ctx.time("lint", _lint, setup=_clear_caches)
+
+
+@benchmark
+def mv(ctx: BenchmarkContext):
+    """Renaming a stage and a folder with `dso mv`"""
+    from dso._mv import mv
+
+    projects = []
+
+    def _setup():
+        _clear_caches()
+        projects.append(ctx.fresh_project())
+
+    def _mv(kind: str):
+        project = projects[-1]
+        source = ctx.stages(project)[0] if kind == "stage" else ctx.stages(project)[0].parent
+        with _chdir(project):
+            mv(source, source.with_name(source.name + "_renamed"))
+
+    ctx.time("mv.stage", lambda: _mv("stage"), setup=_setup)
+    ctx.time("mv.folder", lambda: _mv("folder"), setup=_setup)
+    for p in projects:
+        shutil.rmtree(p.parent)
+
+
+@benchmark
+def increment_prefixes(ctx: BenchmarkContext):
+    """Incrementing the prefixes of all stages in a folder"""
+    from dso._mv import increment_prefixes
+
+    projects = []
+
+    def _setup():
+        _clear_caches()
+        projects.append(ctx.fresh_project())
+
+    def _increment():
+        project = projects[-1]
+        with _chdir(project):
+            increment_prefixes(ctx.stages(project)[0], "02")
+
+    ctx.time("increment_prefixes", _increment, setup=_setup)
+    for p in projects:
+        shutil.rmtree(p.parent)
+
+
+@benchmark
+def watermark(ctx: BenchmarkContext):
+    """Watermarking PNG, SVG and PDF files of different sizes"""
+    from PIL import Image
+    from pypdf import PdfWriter
+
+    from dso._watermark import Watermarker
+
+    inputs = ctx.workdir / "watermark"
+    inputs.mkdir(exist_ok=True)
+    for width, height in [(800, 600), (4000, 3000)]:
+        Image.effect_noise((width, height), 64).convert("RGB").save(inputs / f"image_{width}x{height}.png")
+    svg_elements = "\n".join(
+        f'<circle cx="{(i * 37) % 800}" cy="{(i * 91) % 600}" r="{i % 20 + 1}" fill="#3366{i % 100:02d}"/>'
+        for i in range(5000)
+    )
+    (inputs / "image.svg").write_text(
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="800" height="600" viewBox="0 0 800 600">\n{svg_elements}\n</svg>\n'
+    )
+    writer = PdfWriter()
+    for _ in range(50):
+        writer.add_blank_page(595, 842)
+    with (inputs / "document.pdf").open("wb") as f:
+        writer.write(f)
+
+    for file in sorted(inputs.iterdir()):
+        if file.name.startswith("out_"):
+            continue
+        out = inputs / f"out_{file.name}"
+        ctx.time(
+            f"watermark.{file.name}", lambda file=file, out=out: Watermarker.add_watermark(file, out, text="DRAFT")
+        )
+
+
+@benchmark
+def cli_startup(ctx: BenchmarkContext):
+    """Startup time of the command line interface"""
+
+    def _run(*args):
+        subprocess.run([sys.executable, *args], check=True, capture_output=True)
+
+    ctx.time("cli_startup.import", lambda: _run("-c", "import dso.cli"))
+    ctx.time("cli_startup.help", lambda: _run("-c", "from dso.cli import dso; dso(['--help'])"))
+    ctx.time("cli_startup.command_help", lambda: _run("-c", "from dso.cli import dso; dso(['watermark', '--help'])"))
+    ctx.time("cli_startup.import_api", lambda: _run("-c", "import dso.api"))
+
+
+def _get_metadata(spec: dict) -> dict:
+    from dso import __version__
+
+    return {
+        "schema_version": RESULTS_SCHEMA_VERSION,
+        "dso_version": __version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": datetime.now(UTC).isoformat(),
+        "project": spec,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """
+    Print a comparison of the median times of two runs
+
+    Returns
+    -------
+    True if any benchmark is slower than the baseline by more than a factor of `threshold`
+    """
+    if results["project"] != baseline["project"]:
+        print("Warning: the runs used different project specifications", file=sys.stderr)
+    print(f"\n{'benchmark':<40} {'baseline':>10} {'current':>10} {'ratio':>7}", file=sys.stderr)
+    regression = False
+    for name, res in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        before, after = baseline["benchmarks"][name]["median"], res["median"]
+        ratio = after / before if before > 0 else float("inf")
+        flag = " <-- regression" if ratio > threshold else ""
+        regression |= bool(flag)
+        print(f"{name:<40} {before:9.4f}s {after:9.4f}s {ratio:7.2f}{flag}", file=sys.stderr)
+    return regression
+
+
+def main():
+    """Command line interface of the benchmark suite"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=list(PRESETS), default="medium", help="Size of the synthetic project")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repetitions of each timing")
+    parser.add_argument(
+        "--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS), help="Only run these benchmarks"
+    )
+    parser.add_argument("--output", type=Path, help="Write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="Compare results to a previous JSON results file")
+    parser.add_argument(
+        "--threshold", type=float, default=1.25, help="Fail if a benchmark is slower than this factor (with --compare)"
+    )
+    args = parser.parse_args()
+
+    # don't let logging output distort the timings
+    from dso._logging import log
+
+    log.setLevel(logging.CRITICAL)
+    spec: ProjectSpec = PRESETS[args.preset]
+
+    with tempfile.TemporaryDirectory(prefix="dso_bench_") as tmpdir:
+        tmpdir = Path(tmpdir)
+        print(f"Generating {args.preset} project...", file=sys.stderr)
+        project_info = generate_project(tmpdir / "template" / "project", spec)
+        ctx = BenchmarkContext(tmpdir / "template" / "project", tmpdir, args.repeat)
+        for name in args.only:
+            BENCHMARKS[name](ctx)
+
+    results = {**_get_metadata(project_info | asdict(spec)), "benchmarks": ctx.results}
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    if args.compare is not None and compare(results, json.loads(args.compare.read_text()), args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,21 @@
-from ._metadata import __version__  # noqa
-from .api import here, read_params, set_stage, stage_here, CONFIG, WatermarkedFile
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ._metadata import __version__  # noqa
+    from .api import CONFIG, WatermarkedFile, here, read_params, set_stage, stage_here
 
 __all__ = ["read_params", "here", "stage_here", "set_stage", "CONFIG", "WatermarkedFile"]
+
+
+def __getattr__(name: str):
+    # The API and the package metadata are imported lazily, such that importing `dso.cli` (or any other submodule)
+    # doesn't pay for them.
+    if name == "__version__":
+        from ._metadata import __version__
+
+        return __version__
+    if name in __all__:
+        from . import api
+
+        return getattr(api, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,34 @@
-import filecmp
-import os.path
-import shutil
-import tempfile
-from collections.abc import Collection, Sequence
-from functools import partial
-from io import TextIOWrapper
+import copy
+import hashlib
+import json
+import os
+import re
+from collections.abc import Collection, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO, TextIOWrapper
 from pathlib import Path
 from textwrap import dedent
 
 import hiyapyco
-from ruamel.yaml import YAML, yaml_object
+from jinja2 import TemplateError
+from ruamel.yaml import YAML
+from ruamel.yaml.constructor import RoundTripConstructor
+from ruamel.yaml.representer import RoundTripRepresenter
 
 from ._logging import log
-from ._util import check_project_roots, find_in_parent, get_dso_config_from_pyproject_toml, get_project_root
+from ._metadata import __version__
+from ._util import (
+    check_project_roots,
+    find_in_parent,
+    get_cache_dir,
+    get_dso_config_from_pyproject_toml,
+    get_project_root,
+    git_glob,
+    git_list_existing_files,
+    write_atomic,
+)
+from ._yaml import get_yaml
 
 PARAMS_YAML_DISCLAIMER = dedent(
     """\
@@ -27,13 +43,131 @@ PARAMS_YAML_DISCLAIMER = dedent(
     """
 )
 
+COMPILE_MANIFEST = "compile.json"
+"""Name of the manifest file in the dso cache directory that tracks the inputs of each compiled config"""
+
+_COMPILE_MANIFEST_VERSION = 1
+
+
+def _warn_missing_path(path: Path, source: Path, stage: Path, missing_path_warnings: set[tuple[Path, Path]]):
+    """Warn that a !path does not exist, unless a warning for the same path was already emitted"""
+    if (path, source) not in missing_path_warnings:
+        # Warn, but do not fail (it could also be an output path to be populated by a dvc stage)
+        log.warning(f"Path {path} in stage {stage} does not exist!")
+        missing_path_warnings.add((path, source))
+
+
+def _warn_missing_paths(
+    path_states: Sequence[tuple[str, str, bool]], project_root: Path, missing_path_warnings: set[tuple[Path, Path]]
+):
+    """Warn about all paths that don't exist in a list of `(stage, path, exists)` tuples"""
+    for stage, path, exists in path_states:
+        if not exists:
+            _warn_missing_path(Path(path), project_root / stage, Path(stage), missing_path_warnings)
+
+
+@dataclass
+class _PathContext:
+    """Information about the config file that is currently being loaded, see :class:`AutoAdjustingPathWithLocation`"""
+
+    source: Path
+    """The folder of the config file"""
+    stage: Path
+    """The folder of the config file relative to the project root, for logging purposes only"""
+    relative: bool
+    destination: Path | None
+    missing_path_warnings: set[tuple[Path, Path]] | None
+    paths: list[tuple[str, str]] | None
+
+
+# inherit from `str` to make this compatible with hiyapyco interpolation
+class AutoAdjustingPathWithLocation(str):
+    """
+    Represents a YAML node that adjusts a relative path relative to a specified destination directory.
+
+    Can be evaulated either using Ruamel during dumping YAML to file, or whenever it is cast
+    to a string (e.g. by hiyapyco). To this end, __repr__ and __str__ are overridden.
+
+    Objects are created by :func:`_load_yaml_with_auto_adjusting_paths`, which provides the information about
+    the config file they are defined in via the `path_context` of the :class:`_ParamsYAML` instance.
+    """
+
+    yaml_tag = "!path"
+
+    @classmethod
+    def from_yaml(cls, constructor, node):
+        context: _PathContext = constructor.loader.path_context
+        self = cls(node.value)
+        self.path = Path(node.value)
+        self.source = context.source
+        self.relative = context.relative
+        self.destination = context.destination
+        if context.paths is not None:
+            context.paths.append((str(context.stage), node.value))
+        if context.missing_path_warnings is not None and not (self.source / self.path).exists():
+            _warn_missing_path(self.path, self.source, context.stage, context.missing_path_warnings)
+        return self
+
+    def set_destination(self, destination: Path):
+        _check_destination(destination, self.source)
+        self.destination = destination
+
+    def get_adjusted(self):
+        if self.destination is None:
+            raise ValueError(f"No destination set for path {self.path}")
+        if self.relative:
+            # not possible with pathlib, because pathlib requires the paths to be subpaths of each other
+            return Path(os.path.relpath(self.source / self.path, self.destination))
+        else:
+            return (self.source / self.path).absolute()
+
+    @classmethod
+    def to_yaml(cls, representer, node):
+        return representer.represent_str(str(node.get_adjusted()))
+
+    def __repr__(self):
+        if self.destination is None:
+            return f"!path {self.path}"
+        return str(self.get_adjusted())
+
+    def __str__(self):
+        return str(self.get_adjusted())
+
+
+def _check_destination(destination: Path, source: Path):
+    if not destination.is_relative_to(source):
+        raise ValueError("Destination path can be the same as source, or a child thereof.")
+
+
+class _ParamsConstructor(RoundTripConstructor):
+    """Round-trip constructor that constructs `!path` nodes as :class:`AutoAdjustingPathWithLocation`"""
+
+
+_ParamsConstructor.add_constructor(AutoAdjustingPathWithLocation.yaml_tag, AutoAdjustingPathWithLocation.from_yaml)
+# registered globally (like `yaml_object` does), such that unevaluated !path objects can be dumped by any YAML instance
+RoundTripRepresenter.add_representer(AutoAdjustingPathWithLocation, AutoAdjustingPathWithLocation.to_yaml)
+
+
+class _ParamsYAML(YAML):
+    """
+    YAML loader for params.in.yaml files
+
+    `path_context` needs to be set before loading a file, see :func:`_load_yaml_with_auto_adjusting_paths`.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.Constructor = _ParamsConstructor
+        self.path_context: _PathContext | None = None
+
 
 def _load_yaml_with_auto_adjusting_paths(
     yaml_stream: TextIOWrapper,
-    destination: Path,
-    missing_path_warnings: set[tuple[Path, Path]],
+    destination: Path | None,
+    missing_path_warnings: set[tuple[Path, Path]] | None,
     relative: bool = True,
-):
+    paths: list[tuple[str, str]] | None = None,
+) -> list:
     """
     Load a yaml file and adjust paths for all !path objects based on a destination file
 
@@ -42,76 +176,391 @@ def _load_yaml_with_auto_adjusting_paths(
     yaml_path
         Path of the yaml file to load
     destination
-        Path to which the file shall be adjusted
+        Path to which the file shall be adjusted. If None, the destination needs to be set later
+        using :func:`_set_path_destination` before the !path objects can be evaluated.
     missing_path_warnings
         set in which we keep track of warnings for missing paths to ensure we are
-        not emitting the same warning twice.
+        not emitting the same warning twice. If None, no warnings are emitted.
     relative
         If True, compile to relative paths. Otherwise compile to absolute paths.
+    paths
+        If specified, a `(stage, path)` tuple is appended to this list for each !path object.
 
     Returns
     -------
-    The output of ruamel.yaml.YAML.load_all after registering a class for !path
+    All documents of the yaml file
     """
-    ruamel = YAML()
-
     # The folder of the source config file
     source = Path(yaml_stream.name).parent
     # stage name for logging purposes only
     stage = source.relative_to(get_project_root(source))
 
-    if not destination.is_relative_to(source):
-        raise ValueError("Destination path can be the same as source, or a child thereof.")
+    if destination is not None:
+        _check_destination(destination, source)
+
+    ruamel = get_yaml(cls=_ParamsYAML)
+    ruamel.path_context = _PathContext(source, stage, relative, destination, missing_path_warnings, paths)
+    try:
+        return list(ruamel.load_all(yaml_stream))
+    finally:
+        ruamel.path_context = None
+
+
+class _PathExistsCache:
+    """
+    Cache the existence of !path targets for a single compile run.
+
+    The same paths are usually checked many times per run, e.g. paths defined in a parent config are part of every
+    child config. With this cache, each path is only checked once on the file system.
+
+    Optionally, the cache can be populated in bulk with all files known to git (see :meth:`add_known_files`).
+    Only positive results are taken from git, all other paths are still checked on the file system, as they may
+    be ignored by git (e.g. outputs of dvc stages).
+    """
+
+    def __init__(self):
+        self._cache: dict[str, bool] = {}
+        self._known: set[str] = set()
+
+    def add_known_files(self, dir: Path):
+        """Mark all files in `dir` that are tracked or untracked (but not ignored) by git, and their parent directories, as existing"""
+        files = git_list_existing_files(dir)
+        if files is None:
+            log.debug(f"Could not list files with git in {dir}, checking the existence of paths individually.")
+            return
+        for file in files:
+            file = str(file)
+            while file not in self._known:
+                self._known.add(file)
+                file = os.path.dirname(file)
+
+    def __call__(self, path: Path) -> bool:
+        """Check if `path` exists"""
+        key = str(path)
+        if (exists := self._cache.get(key)) is None:
+            # paths are normalized lexically to look them up in the files known to git
+            exists = (bool(self._known) and os.path.normpath(key) in self._known) or os.path.exists(key)
+            self._cache[key] = exists
+        return exists
+
+
+def _set_path_destination(data, destination: Path):
+    """Recursively set the destination of all !path objects in data loaded with `_load_yaml_with_auto_adjusting_paths`"""
+    if isinstance(data, dict):
+        for value in data.values():
+            _set_path_destination(value, destination)
+    elif isinstance(data, list):
+        for value in data:
+            _set_path_destination(value, destination)
+    elif getattr(data, "yaml_tag", None) == "!path":
+        data.set_destination(destination)
+
+
+_PRIMITIVE_TYPES = (int, str, bool, float)
+_LIST_TYPES = (list, tuple)
+_JINJA2_DELIMITERS = ("{{", "{%", "{#")
+
+
+def _deepmerge(a, b):
+    """
+    Deep-merge `b` on top of `a` without modifying any of the inputs.
+
+    This reproduces the semantics of `hiyapyco.load(..., method=METHOD_MERGE, none_behavior=NONE_BEHAVIOR_OVERRIDE)`
+    for already loaded documents. We don't use hiyapyco's implementation directly, because it eagerly formats
+    the entire data structure for debug messages at every recursion step, even if debug logging is disabled.
+    """
+    # equivalent to hiyapyco's `dereferenceyamlanchors=True`
+    a = copy.deepcopy(a)
+    b = copy.deepcopy(b)
+    if b is None:
+        # override -> None replaces object, no matter what.
+        return None
+    if a is None or isinstance(b, _PRIMITIVE_TYPES):
+        return b
+    if isinstance(a, _LIST_TYPES):
+        if not isinstance(b, _LIST_TYPES):
+            raise hiyapyco.HiYaPyCoImplementationException(
+                f'can not merge {type(b)} to {type(a)} (@ "{a}"  try to merge "{b}")'
+            )
+        a.extend(be for be in b if be not in a and isinstance(be, _PRIMITIVE_TYPES + _LIST_TYPES))
+        srcdicts = {k: bd for k, bd in enumerate(b) if isinstance(bd, dict)}
+        for k, ad in enumerate(a):
+            # dicts at the same position are merged only if at least one key is matching
+            if isinstance(ad, dict) and k in srcdicts and any(ak in srcdicts[k] for ak in ad):
+                a[k] = _deepmerge(ad, srcdicts.pop(k))
+        a.extend(srcdicts.values())
+    elif isinstance(a, dict):
+        if isinstance(b, dict):
+            for k in b:
+                a[k] = _deepmerge(a[k], b[k]) if k in a else b[k]
+        elif isinstance(b, _LIST_TYPES):
+            for bd in b:
+                if not isinstance(bd, dict):
+                    raise hiyapyco.HiYaPyCoImplementationException(
+                        f'can not merge element from list of type {type(b)} to dict (@ "{a}" try to merge "{b}")'
+                    )
+                a = _deepmerge(a, bd)
+        else:
+            raise hiyapyco.HiYaPyCoImplementationException(
+                f'can not merge {type(b)} to {type(a)} (@ "{a}" try to merge "{b}")'
+            )
+    return a
+
+
+def _interpolate(d, data):
+    """
+    Recursively resolve jinja2 templates in `d` based on `data`. `d` is modified inplace.
 
-    # inherit from `str` to make this compatible with hiyapyco interpolation
-    @yaml_object(ruamel)
-    class AutoAdjustingPathWithLocation(str):
+    This reproduces the semantics of `hiyapyco.load(..., interpolate=True)`.
+    """
+    if d is None:
+        return None
+    if isinstance(d, str):
+        return _interpolate_str(d, data)
+    if isinstance(d, _PRIMITIVE_TYPES):
+        return d
+    if isinstance(d, _LIST_TYPES):
+        for k, v in enumerate(d):
+            d[k] = _interpolate(v, data)
+        return d
+    if isinstance(d, dict):
+        for k in d.keys():
+            d[k] = _interpolate(d[k], data)
+        return d
+    raise hiyapyco.HiYaPyCoImplementationException(f'can not interpolate "{d}" of type {type(d)}')
+
+
+def _interpolate_str(s: str, data) -> str:
+    # evaluates !path objects
+    s = str(s)
+    if not any(delimiter in s for delimiter in _JINJA2_DELIMITERS):
+        # Shortcut for strings without templates: compiling a jinja2 template is expensive.
+        # Rendering would only normalize newlines and remove a single trailing newline.
+        lines = re.split(r"\r\n|\r|\n", s)
+        if lines[-1] == "":
+            del lines[-1]
+        return "\n".join(lines)
+    try:
+        return hiyapyco.jinja2env.from_string(s).render(data)
+    except TemplateError as e:
+        raise hiyapyco.HiYaPyCoImplementationException(f'error interpolating string "{s}" : {e}') from e
+
+
+class _ConfigTree:
+    """
+    Merge a hierarchy of config files, parsing each file only once.
+
+    Configs are merged top-down: a child config is merged on top of the cached merge result of its
+    parent config. Only the results of configs that are a parent of another config are cached.
+    Jinja2 interpolation and adjusting !path objects to the destination happens on a copy of the merged data.
+    The result is the same as merging all parent configs with `hiyapyco.load`.
+
+    Parameters
+    ----------
+    all_configs
+        All config files to consider. The parents of each config file must be part of the collection.
+    relative
+        If True, compile to relative paths. Otherwise compile to absolute paths.
+
+    No warnings are emitted for missing paths. Instead, the existence of all !path objects is reported
+    by :meth:`compile`, see :func:`_warn_missing_paths`.
+    """
+
+    def __init__(self, all_configs: Collection[Path], *, relative: bool, path_exists: _PathExistsCache | None = None):
+        self.relative = relative
+        self.path_exists = path_exists if path_exists is not None else _PathExistsCache()
+        self._documents: dict[Path, list] = {}
+        self._paths: dict[Path, list[tuple[str, str]]] = {}
+        self.set_configs(all_configs)
+
+    def set_configs(self, all_configs: Collection[Path]):
         """
-        Represents a YAML node that adjusts a relative path relative to a specified destination directory.
+        Update the collection of config files, e.g. because config files were added or removed.
 
-        Can be evaulated either using Ruamel during dumping YAML to file, or whenever it is cast
-        to a string (e.g. by hiyapyco). To this end, __repr__ and __str__ are overridden.
+        Parsed config files are kept, only the merged configs are discarded.
         """
+        self.all_configs = all_configs
+        self._config_index = _index_configs(all_configs)
+        self._parents: dict[Path, list[Path]] = {}
+        self._has_children = {
+            parents[-2]
+            for parents in (_get_parent_configs(c, self._config_index) for c in all_configs)
+            if len(parents) > 1
+        }
+        self._merged: dict[Path, object] = {}
+
+    def invalidate(self, config: Path):
+        """Discard the parsed content of `config` and all merged configs that depend on it, e.g. because it was modified"""
+        self._documents.pop(config, None)
+        self._paths.pop(config, None)
+        self._merged = {
+            c: merged for c, merged in self._merged.items() if c != config and config not in self.parent_configs(c)
+        }
+
+    def parent_configs(self, config: Path) -> list[Path]:
+        """All parent configs of `config`, sorted from parent to child"""
+        if config not in self._parents:
+            self._parents[config] = _get_parent_configs(config, self._config_index)[:-1]
+        return self._parents[config]
+
+    def _load(self, config: Path) -> list:
+        if config not in self._documents:
+            paths: list[tuple[str, str]] = []
+            with open(config, encoding="utf-8") as f:
+                self._documents[config] = list(
+                    _load_yaml_with_auto_adjusting_paths(
+                        f,
+                        destination=None,
+                        missing_path_warnings=None,
+                        relative=self.relative,
+                        paths=paths,
+                    )
+                )
+            self._paths[config] = paths
+        return self._documents[config]
+
+    def _merge(self, config: Path):
+        """Merge a config on top of its parents, without interpolating"""
+        if config in self._merged:
+            return self._merged[config]
+        parents = self.parent_configs(config)
+        parent_data = self._merge(parents[-1]) if parents else None
+        merged = parent_data
+        for doc in self._load(config):
+            # equivalent to hiyapyco: the first document is used as-is
+            merged = doc if merged is None else _deepmerge(merged, doc)
+        if config in self._has_children:
+            self._merged[config] = merged
+        return merged
+
+    def compile(self, config: Path) -> tuple[dict, list[tuple[str, str, bool]]]:
+        """
+        Get the final, interpolated config
 
-        yaml_tag = "!path"
+        Returns
+        -------
+        The config and a list of `(stage, path, exists)` tuples of all !path objects in the config and its parents.
+        """
+        conf = copy.deepcopy(self._merge(config))
+        _set_path_destination(conf, config.parent)
+        conf = _interpolate(conf, conf)
+        # an empty configuration should actually be an empty dictionary.
+        if conf is None:
+            conf = {}
+        path_states = [
+            (stage, path, self.path_exists(c.parent / path))
+            for c in [*self.parent_configs(config), config]
+            for stage, path in self._paths[c]
+        ]
+        return conf, path_states
 
-        def __init__(self, path: str):
-            self.path = Path(path)
-            if not (source / self.path).exists():
-                # check if warning for the same path was already emitted
-                if (self.path, source) not in missing_path_warnings:
-                    # Warn, but do not fail (it could also be an output path to be populated by a dvc stage)
-                    log.warning(f"Path {self.path} in stage {stage} does not exist!")
-                    missing_path_warnings.add((self.path, source))
 
-        def get_adjusted(self):
-            if relative:
-                # not possible with pathlib, because pathlib requires the paths to be subpaths of each other
-                return Path(os.path.relpath(source / self.path, destination))
-            else:
-                return (source / self.path).absolute()
+def _write_params_yaml(out_file: Path, conf: dict) -> tuple[str, bool]:
+    """
+    Write a compiled config to `out_file`, but only if it changed.
+
+    Returns
+    -------
+    The hash of the compiled config file and whether it was written
+    """
+    # Render in memory and compare to previous params.yaml
+    # Only overwrite and show log if they are different
+    buf = BytesIO()
+    buf.write(PARAMS_YAML_DISCLAIMER.encode("utf-8"))
+    buf.write(b"\n")
+    get_yaml().dump(conf, buf)
+    data = buf.getvalue()
+    try:
+        changed = out_file.read_bytes() != data
+    except FileNotFoundError:
+        changed = True
+    if changed:
+        write_atomic(out_file, data)
+    return hashlib.sha256(data).hexdigest(), changed
+
+
+def _compile_config(config_tree: _ConfigTree, config: Path) -> tuple[str, bool, list[tuple[str, str, bool]]]:
+    """
+    Compile a single config and write it to `params.yaml` in the same directory
+
+    Returns
+    -------
+    The hash of the compiled config, whether it was written and the `(stage, path, exists)` tuples of all !path objects
+    """
+    conf, path_states = config_tree.compile(config)
+    output_hash, changed = _write_params_yaml(config.parent / "params.yaml", conf)
+    return output_hash, changed, path_states
+
+
+# Each worker process of the process pool keeps its own config tree, such that parent configs
+# are parsed at most once per worker.
+_worker_config_tree: _ConfigTree | None = None
 
-        @classmethod
-        def to_yaml(cls, representer, node):
-            return representer.represent_str(str(node.get_adjusted()))
 
-        def __repr__(self):
-            return str(self.get_adjusted())
+def _init_worker(all_configs: Collection[Path], relative: bool, path_exists: _PathExistsCache):
+    global _worker_config_tree
+    _worker_config_tree = _ConfigTree(all_configs, relative=relative, path_exists=path_exists)
 
-        def __str__(self):
-            return str(self.get_adjusted())
 
-        @classmethod
-        def from_yaml(cls, constructor, node):
-            return cls(node.value)
+def _compile_config_in_worker(config: Path) -> tuple[str, bool, list[tuple[str, str, bool]]]:
+    assert _worker_config_tree is not None, "Worker was not initialized"
+    return _compile_config(_worker_config_tree, config)
 
-    return ruamel.load_all(yaml_stream)
+
+def _compile_configs(
+    configs: Sequence[Path],
+    all_configs: Collection[Path],
+    *,
+    relative: bool,
+    jobs: int,
+    path_exists: _PathExistsCache,
+    config_tree: _ConfigTree | None = None,
+) -> list[tuple[str, bool, list[tuple[str, str, bool]]]]:
+    """
+    Compile multiple configs, optionally spreading the work across a pool of `jobs` processes.
+
+    If a `config_tree` is given, the configs are compiled in the current process using that tree, such that
+    config files already parsed by the tree are reused.
+
+    The results are returned in the same order as `configs`.
+    """
+    jobs = min(jobs, len(configs))
+    if config_tree is not None or jobs <= 1:
+        if config_tree is None:
+            config_tree = _ConfigTree(all_configs, relative=relative, path_exists=path_exists)
+        else:
+            config_tree.path_exists = path_exists
+        return [_compile_config(config_tree, config) for config in configs]
+
+    # Consecutive configs are likely to share the same parents. Submitting them in chunks keeps
+    # the number of times parents need to be parsed in different workers low.
+    chunksize = max(1, len(configs) // (jobs * 4))
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(all_configs, relative, path_exists)
+    ) as pool:
+        return list(pool.map(_compile_config_in_worker, configs, chunksize=chunksize))
+
+
+def _find_configs(dir: Path) -> list[Path]:
+    """Find all files named params.in.yaml in `dir` and all subdirectories that are not .gitignored.
+
+    A params.in.yaml directly in `dir` is always included, even if it is .gitignored. Falls back to a recursive glob
+    if `dir` is not within a git working tree or git doesn't list any files in it (e.g. because `dir` itself
+    is .gitignored).
+    """
+    configs = git_glob(dir, "**/params.in.yaml")
+    if not configs:
+        log.debug(f"No params.in.yaml files listed by git in {dir}, searching for them recursively.")
+        return list(dir.glob("**/params.in.yaml"))
+    if (config := dir / "params.in.yaml").is_file() and config not in configs:
+        configs.append(config)
+    return configs
 
 
 def _get_list_of_configs_to_compile(paths: Sequence[Path], project_root: Path):
     """Find all files named params.in.yaml in `dir` and all subdirectories"""
     # Get all configs that are children of the current working directory
-    all_configs = {x for dir in paths for x in dir.glob("**/params.in.yaml")}
+    all_configs = {x for dir in paths for x in _find_configs(dir)}
     for c in all_configs:
         assert c.is_relative_to(project_root), "Config file not relative to project root"
 
@@ -129,27 +578,185 @@ def _get_list_of_configs_to_compile(paths: Sequence[Path], project_root: Path):
     return all_configs
 
 
-def _get_parent_configs(current_config: Path, all_configs: Collection[Path]) -> list[Path]:
-    """For a particular config file, find all config files that are parent to it in a list of config files.
+def _get_paths_affected_by_changes(
+    paths: Sequence[Path], changed_files: Collection[Path], project_root: Path
+) -> list[Path]:
+    """
+    Restrict `paths` to the directories whose configs are affected by `changed_files`.
+
+    A config is affected if its own params.in.yaml or the params.in.yaml of any parent directory changed (including
+    added and removed files). If the `pyproject.toml` of the project changed, all configs are affected.
+    The resulting directories can be passed to :func:`compile_all_configs`, which also compiles all child directories.
+    """
+    paths = [p.parent.resolve() if p.is_file() else p.resolve() for p in paths]
+    if project_root / "pyproject.toml" in changed_files:
+        return paths
+    affected = set()
+    for dir in {f.parent for f in changed_files if f.name == "params.in.yaml"}:
+        for path in paths:
+            if dir.is_relative_to(path):
+                affected.add(dir)
+            elif path.is_relative_to(dir):
+                affected.add(path)
+    # if a directory was removed, there is nothing to compile in it anymore
+    return sorted(d for d in affected if d.is_dir())
+
+
+def _index_configs(all_configs: Collection[Path]) -> dict[Path, Path]:
+    """Index config files by the directory they are located in, for fast lookup of parent configs"""
+    return {config.parent: config for config in all_configs}
+
+
+def _get_parent_configs(current_config: Path, config_index: Mapping[Path, Path]) -> list[Path]:
+    """For a particular config file, find all config files that are parent to it.
+
+    Walks up the directory tree starting from the config file and looks up each directory in `config_index`
+    (see :func:`_index_configs`).
 
     The files are sorted from parent to child. The current_config is always the last item in the list.
     """
-    parent_configs = []
-    for tmp_cfg in all_configs:
-        if current_config.is_relative_to(tmp_cfg.parent):
-            parent_configs.append(tmp_cfg)
+    parent_configs = [current_config]
+    for directory in current_config.parent.parents:
+        if (config := config_index.get(directory)) is not None:
+            parent_configs.append(config)
+
+    # sort from parent to child
+    return parent_configs[::-1]
+
+
+def _read_compile_manifest(project_root: Path) -> dict[str, dict]:
+    """
+    Read the compile manifest from the dso cache directory.
 
-    # sort from parent to child (based on the number of path parts)
-    return sorted(parent_configs, key=lambda x: len(x.parts))
+    Returns a dictionary mapping the path of each config file (relative to the project root) to the
+    inputs and output it was last compiled from/to. If the manifest doesn't exist, is corrupted or was
+    written by a different version of dso, an empty dictionary is returned.
+    """
+    manifest_file = project_root / ".dso" / "cache" / COMPILE_MANIFEST
+    try:
+        with manifest_file.open("rb") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict):
+        return {}
+    if manifest.get("version") != _COMPILE_MANIFEST_VERSION or manifest.get("dso_version") != __version__:
+        return {}
+    return manifest.get("configs", {})
+
+
+def _write_compile_manifest(project_root: Path, configs: dict[str, dict]):
+    """Write the compile manifest to the dso cache directory"""
+    manifest = {"version": _COMPILE_MANIFEST_VERSION, "dso_version": __version__, "configs": configs}
+    write_atomic(get_cache_dir(project_root) / COMPILE_MANIFEST, json.dumps(manifest).encode("utf-8"))
+
+
+def _hash_file(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _get_input_hash(
+    configs_to_merge: Sequence[Path], project_root: Path, dso_config: dict, file_hashes: dict[Path, str]
+) -> str:
+    """
+    Compute a hash of all inputs of a config that are known before compiling it.
 
+    This includes the project root (relevant for absolute paths), the `[tool.dso]` settings and the
+    content of the config file and all its parents. The hashes of individual files are memoized in
+    `file_hashes` to not read the same parent config multiple times.
+    """
+    h = hashlib.sha256()
+    h.update(str(project_root).encode("utf-8"))
+    h.update(json.dumps(dso_config, sort_keys=True, default=str).encode("utf-8"))
+    for config in configs_to_merge:
+        if config not in file_hashes:
+            file_hashes[config] = _hash_file(config)
+        h.update(f"\0{config.relative_to(project_root)}\0{file_hashes[config]}".encode())
+    return h.hexdigest()
+
+
+def _is_up_to_date(
+    entry: dict | None, input_hash: str, out_file: Path, project_root: Path, path_exists: _PathExistsCache
+) -> bool:
+    """
+    Check if a config needs to be recompiled based on its entry in the compile manifest.
+
+    A config is up-to-date if neither its inputs nor the existence of any of its !path objects changed and
+    the output file was not modified since it was compiled.
+    """
+    if entry is None or entry.get("inputs") != input_hash:
+        return False
+    for stage, path, exists in entry["paths"]:
+        if path_exists(project_root / stage / path) != exists:
+            return False
+    try:
+        return _hash_file(out_file) == entry["output"]
+    except OSError:
+        return False
+
+
+def is_config_up_to_date(config: Path, project_root: Path) -> bool:
+    """
+    Check if the params.yaml of a single config is up-to-date, without compiling anything.
+
+    Applies the same criteria as :func:`compile_all_configs` (see :func:`_is_up_to_date`), i.e. the config, its parent
+    configs and the `[tool.dso]` settings are hashed and compared to the compile manifest. In contrast to
+    :func:`compile_all_configs`, configs in subdirectories are not discovered and checked, which makes this cheap
+    enough to be called before every `get_config`.
 
-def compile_all_configs(paths: Sequence[Path]):
+    Warnings about missing `!path` targets are emitted as if the config had been compiled.
+
+    Parameters
+    ----------
+    config
+        Absolute path to a params.in.yaml file
+    project_root
+        The project root of `config`
+    """
+    if not config.is_file() or not config.is_relative_to(project_root):
+        return False
+    entry = _read_compile_manifest(project_root).get(str(config.relative_to(project_root)))
+    if entry is None:
+        return False
+    parent_dirs = [d for d in config.parent.parents if d.is_relative_to(project_root)]
+    configs_to_merge = [d / "params.in.yaml" for d in parent_dirs[::-1] if (d / "params.in.yaml").is_file()]
+    configs_to_merge.append(config)
+    dso_config = get_dso_config_from_pyproject_toml(project_root)
+    input_hash = _get_input_hash(configs_to_merge, project_root, dso_config, {})
+    if not _is_up_to_date(entry, input_hash, config.parent / "params.yaml", project_root, _PathExistsCache()):
+        return False
+    _warn_missing_paths(entry["paths"], project_root, set())
+    return True
+
+
+def compile_all_configs(paths: Sequence[Path], *, force: bool = False, jobs: int | None = None):
     """Compile params.in.yaml into params.yaml using Jinja2 templating and resolving recursive templates.
 
+    Configs whose inputs did not change since they were last compiled are skipped. To this end, the inputs of
+    each config are tracked in a manifest in the `.dso/cache` directory of the project.
+
     paths:
         One or multiple locations within the project. Can be files or directories -- instead of files, their
         parent directory will be used. Will compile all params.in.yaml files in child directories
         and the respective parent config files.
+    force:
+        If True, ignore the manifest and recompile all configs.
+    jobs:
+        Number of processes to use for compiling configs in parallel. `0` uses all available CPUs.
+        Defaults to the `compile_jobs` setting in `[tool.dso]`, or `1` if it's not set.
+    """
+    _compile_all_configs(paths, force=force, jobs=jobs)
+
+
+def _compile_all_configs(
+    paths: Sequence[Path], *, force: bool = False, jobs: int | None = None, config_tree: _ConfigTree | None = None
+):
+    """
+    Implementation of :func:`compile_all_configs`.
+
+    Optionally, a long-lived `config_tree` can be passed that is used to compile the configs (see
+    :class:`dso._watch.ConfigWatcher`). It must have been created with the `use_relative_paths` setting of the project
+    and contain all configs found in `paths`.
     """
     # If files are specified, use the respective parent dir
     paths = [p.parent.resolve() if p.is_file() else p.resolve() for p in paths]
@@ -163,47 +770,67 @@ def compile_all_configs(paths: Sequence[Path]):
     dso_config = get_dso_config_from_pyproject_toml(project_root)
     # by default, use relative paths
     use_relative_paths = dso_config.get("use_relative_paths", True)
+    if jobs is None:
+        jobs = int(dso_config.get("compile_jobs", 1))
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
 
     # keep track of paths for which we emitted a warning that the path doesn't exist to ensure
     # we are only emitting one warning for each (file path, source yaml file path)
     missing_path_warnings: set[tuple[Path, Path]] = set()
 
-    for config in all_configs:
-        # sorted sorts path from parent to child. This is what we want as hyapyco gives precedence to configs
-        # later in the list.
-        configs_to_merge = _get_parent_configs(config, all_configs)
-        conf = hiyapyco.load(
-            *[str(x) for x in configs_to_merge],
-            method=hiyapyco.METHOD_MERGE,
-            none_behavior=hiyapyco.NONE_BEHAVIOR_OVERRIDE,
-            interpolate=True,
-            loader_callback=partial(
-                _load_yaml_with_auto_adjusting_paths,
-                destination=config.parent,
-                missing_path_warnings=missing_path_warnings,
-                relative=use_relative_paths,
-            ),
-        )
-        # an empty configuration should actually be an empty dictionary.
-        if conf is None:
-            conf = {}
-        # write config to "params.yaml" in same directory
-        out_file = config.parent / "params.yaml"
-
-        # Write to temporary file first and compare to previous params.yaml
-        # Only ask for confirmation, overwrite, and show log if they are different
-        with tempfile.NamedTemporaryFile() as tmpfile:
-            # dump to tempfile
-            with open(tmpfile.name, "w") as f:
-                f.write(PARAMS_YAML_DISCLAIMER)
-                f.write("\n")
-                ruamel = YAML()
-                ruamel.dump(conf, f)
-            # check for equivalience
-            if not out_file.exists() or not filecmp.cmp(f.name, out_file, shallow=False):
-                shutil.copy(tmpfile.name, out_file)
-                log.debug(f"Compiled ./{config.relative_to(project_root)} to {out_file.name}")
-            else:
-                log.debug(f"./{config.relative_to(project_root)} [green]is already up-to-date!")
+    manifest = {} if force else _read_compile_manifest(project_root)
+    manifest_changed = force
+    file_hashes: dict[Path, str] = {}
+
+    path_exists = _PathExistsCache()
+    if dso_config.get("path_cache_from_git", False):
+        path_exists.add_known_files(project_root)
+
+    config_index = _index_configs(all_configs)
+    stale_configs = []
+    input_hashes = {}
+    for config in sorted(all_configs):
+        config_key = str(config.relative_to(project_root))
+        configs_to_merge = _get_parent_configs(config, config_index)
+        input_hashes[config] = _get_input_hash(configs_to_merge, project_root, dso_config, file_hashes)
+        entry = manifest.get(config_key)
+        if _is_up_to_date(entry, input_hashes[config], config.parent / "params.yaml", project_root, path_exists):
+            assert entry is not None
+            # still warn about missing paths, as if the config had been compiled
+            _warn_missing_paths(entry["paths"], project_root, missing_path_warnings)
+            log.debug(f"./{config_key} [green]is already up-to-date!")
+        else:
+            stale_configs.append(config)
+
+    results = _compile_configs(
+        stale_configs,
+        all_configs,
+        relative=use_relative_paths,
+        jobs=jobs,
+        path_exists=path_exists,
+        config_tree=config_tree,
+    )
+    for config, (output_hash, changed, path_states) in zip(stale_configs, results, strict=True):
+        config_key = str(config.relative_to(project_root))
+        _warn_missing_paths(path_states, project_root, missing_path_warnings)
+        if changed:
+            log.debug(f"Compiled ./{config_key} to params.yaml")
+        else:
+            log.debug(f"./{config_key} [green]is already up-to-date!")
+        manifest[config_key] = {"inputs": input_hashes[config], "output": output_hash, "paths": path_states}
+        manifest_changed = True
+
+    # forget about configs that have been removed in the meanwhile. Only configs within the compiled directories are
+    # checked, and only if they weren't discovered (to not check the existence of all configs of the project).
+    discovered = {str(config.relative_to(project_root)) for config in all_configs}
+    prefixes = tuple("" if p == project_root else f"{p.relative_to(project_root)}{os.sep}" for p in paths)
+    for config_key in [
+        k for k in manifest if k not in discovered and k.startswith(prefixes) and not (project_root / k).is_file()
+    ]:
+        del manifest[config_key]
+        manifest_changed = True
+    if manifest_changed:
+        _write_compile_manifest(project_root, manifest)
 
     log.info("[green]Configuration compiled successfully.")
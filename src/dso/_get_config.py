@@ -2,14 +2,15 @@
 
 import re
 import sys
-from collections.abc import Collection
+from collections.abc import Callable, Collection, Sequence
+from functools import cache, partial
 from itertools import groupby
 from pathlib import Path
-
-from ruamel.yaml import YAML
+from typing import Any
 
 from dso._logging import log
 from dso._util import get_project_root
+from dso._yaml import load_yaml_cached
 
 
 def _filter_nested_dict(data: dict, keys: Collection[str]) -> dict:
@@ -45,29 +46,108 @@ def get_config(stage: str, *, all: bool = False, skip_compile: bool = False) ->
         If true, the config is not filtered based on the `dvc.yaml` file.
     skip_compile
         If `True`, do not compile the config before loading it.
-        If `False`, always compile.
+        If `False`, compile the config unless it is already up-to-date, i.e. neither the `params.in.yaml` files
+        of the stage and its parents, the `[tool.dso]` settings nor the existence of `!path` targets changed since
+        it was last compiled.
+    """
+    return get_configs([stage], all=all, skip_compile=skip_compile)[stage]
+
+
+def get_configs(stages: Sequence[str], *, all: bool = False, skip_compile: bool = False) -> dict[str, dict]:
+    """
+    Get the configuration for multiple stages at once
+
+    Equivalent to calling :func:`get_config` for each stage, but all stale configs are compiled in a single
+    call to :func:`~dso._compile_config.compile_all_configs` and each `dvc.yaml` file is only loaded once.
+
+    Parameters
+    ----------
+    stages
+        paths to the stages relative to the project root, see :func:`get_config`.
+    all
+        If true, the configs are not filtered based on the `dvc.yaml` files.
+    skip_compile
+        If `True`, do not compile the configs before loading them.
+
+    Returns
+    -------
+    A dictionary mapping each stage to its configuration
     """
-    from dso._compile_config import compile_all_configs
+    from dso._compile_config import compile_all_configs, is_config_up_to_date
 
     proj_root = get_project_root(Path.cwd())
-    log.info(f"Retrieving config for stage ./{stage}")
-    if ":" in stage:
-        stage_path, stage_name = stage.split(":")
-    else:
-        stage_path, stage_name = stage, None
+    stage_paths = {}
+    for stage in stages:
+        log.info(f"Retrieving config for stage ./{stage}")
+        if ":" in stage:
+            stage_path, stage_name = stage.split(":")
+        else:
+            stage_path, stage_name = stage, None
 
-    stage_path = proj_root / stage_path
-    if not stage_path.exists():
-        log.error(f"Path to stage does not exist: {stage_path}")
-        sys.exit(1)
+        stage_path = proj_root / stage_path
+        if not stage_path.exists():
+            log.error(f"Path to stage does not exist: {stage_path}")
+            sys.exit(1)
+        stage_paths[stage] = (stage_path, stage_name)
+
+    stale_paths = []
+    for stage_path in dict.fromkeys(p for p, _ in stage_paths.values()):
+        if skip_compile:
+            log.debug("Skipping compilation of configuration")
+        elif is_config_up_to_date((stage_path / "params.in.yaml").resolve(), proj_root):
+            log.debug("Skipping compilation of configuration, it is already up-to-date")
+        else:
+            stale_paths.append(stage_path)
+    if stale_paths:
+        compile_all_configs(stale_paths)
+
+    load_dvc_yaml = cache(partial(load_yaml_cached, project_root=proj_root))
+    return {
+        stage: _get_stage_config(stage_path, stage_name, proj_root, all=all, load_dvc_yaml=load_dvc_yaml)
+        for stage, (stage_path, stage_name) in stage_paths.items()
+    }
+
+
+def find_stages(project_root: Path) -> list[str]:
+    """
+    Find all stages of a project
+
+    A stage is a directory with a `params.in.yaml` file and a `dvc.yaml` file that defines at least one stage.
+    If a `dvc.yaml` file defines multiple stages, each of them is returned as `path/to/stage:stage_name`.
+
+    Returns
+    -------
+    Paths to the stages relative to the project root, suitable for :func:`get_configs`
+    """
+    from dso._compile_config import _find_configs
 
-    if not skip_compile:
-        log.debug("Skipping compilation of configuration")
-        compile_all_configs([stage_path])
-    yaml = YAML(typ="safe")
+    stages = []
+    for config in sorted(_find_configs(project_root)):
+        try:
+            dvc_config = load_yaml_cached(config.parent / "dvc.yaml", project_root)
+        except OSError:
+            continue
+        dvc_stages = dvc_config.get("stages") if isinstance(dvc_config, dict) else None
+        if not dvc_stages:
+            continue
+        stage_path = config.parent.relative_to(project_root).as_posix()
+        if len(dvc_stages) == 1:
+            stages.append(stage_path)
+        else:
+            stages += [f"{stage_path}:{name}" for name in dvc_stages]
+    return stages
 
+
+def _get_stage_config(
+    stage_path: Path, stage_name: str | None, proj_root: Path, *, all: bool, load_dvc_yaml: Callable[[Path], Any]
+) -> dict:
+    """
+    Load the config of a single (compiled) stage and filter it based on `dvc.yaml`
+
+    `load_dvc_yaml` may return the same object for multiple stages, therefore it must not be modified.
+    """
     try:
-        config = yaml.load(stage_path / "params.yaml")
+        config = load_yaml_cached(stage_path / "params.yaml", proj_root)
     except OSError:
         log.error("No params.yaml (or compilable params.in.yaml) found in directory.")
         sys.exit(1)
@@ -76,7 +156,7 @@ def get_config(stage: str, *, all: bool = False, skip_compile: bool = False) ->
         return config
     else:
         try:
-            dvc_config = yaml.load(stage_path / "dvc.yaml")
+            dvc_config = load_dvc_yaml(stage_path / "dvc.yaml")
         except OSError:
             log.error("No dvc.yaml found in directory.")
             sys.exit(1)
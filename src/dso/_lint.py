@@ -8,10 +8,9 @@ from functools import cache
 from os import chdir
 from pathlib import Path
 
-from ruamel.yaml import YAML
-
 from dso._logging import log
 from dso._util import check_project_roots, find_in_parent, get_project_root, git_list_files
+from dso._yaml import get_yaml
 
 
 class LintError(Exception):
@@ -188,7 +187,7 @@ class DSOLinter:
     @staticmethod
     def _get_linting_config(config_file: Path):
         """Get the linting config from a params.yaml file"""
-        yaml = YAML(typ="safe")
+        yaml = get_yaml("safe")
         config = yaml.load(config_file)
         dso_config = config.get("dso", {})
         if dso_config is None:
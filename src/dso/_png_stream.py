@@ -0,0 +1,205 @@
+"""Read and write PNG files in bands of rows with bounded memory
+
+Pillow always decodes and encodes entire images. For images that are larger than the available memory, the classes
+in this module split the compressed PNG data stream into bands of rows and let Pillow decode/encode each band as a
+small, self-contained PNG file. PNG filters can reference the previous row, therefore the last row of the previous band
+is prepended (unfiltered) to each band. This keeps all per-pixel work in Pillow's C code.
+"""
+
+import io
+import struct
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from typing import BinaryIO
+
+from PIL import Image
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+"""Number of channels for each supported PNG color type (grayscale, RGB, palette, grayscale+alpha, RGBA)"""
+
+_READ_SIZE = 1 << 20
+"""Maximum number of bytes read from the input file at once"""
+
+_IDAT_SIZE = 1 << 16
+"""Maximum size of the IDAT chunks written to the output file"""
+
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def _read_idat(png: bytes) -> bytes:
+    """Get the concatenated content of all IDAT chunks of an in-memory PNG file"""
+    pos = len(PNG_SIGNATURE)
+    idat = []
+    while pos < len(png):
+        (length,) = struct.unpack(">I", png[pos : pos + 4])
+        if png[pos + 4 : pos + 8] == b"IDAT":
+            idat.append(png[pos + 8 : pos + 8 + length])
+        pos += length + 12
+    return b"".join(idat)
+
+
+class PNGBandReader:
+    """
+    Decode a PNG file in bands of rows.
+
+    Only non-interlaced PNG files with a bit depth of 8 are supported, see :meth:`get_size`.
+
+    Parameters
+    ----------
+    file
+        A binary file object positioned at the start of the PNG file
+    """
+
+    def __init__(self, file: BinaryIO):
+        self._file = file
+        if file.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            raise ValueError("Not a PNG file")
+        self._ancillary: dict[bytes, bytes] = {}
+        self._pending_idat = 0
+        while True:
+            length, chunk_type = struct.unpack(">I4s", file.read(8))
+            if chunk_type == b"IDAT":
+                self._pending_idat = length
+                break
+            data = file.read(length)
+            file.read(4)  # CRC
+            if chunk_type == b"IHDR":
+                self._ihdr = data
+                self.width, self.height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", data)
+                if bit_depth != 8 or color_type not in _CHANNELS or interlace != 0:
+                    raise ValueError("Only non-interlaced PNG files with a bit depth of 8 are supported")
+                self._stride = self.width * _CHANNELS[color_type]
+            elif chunk_type in (b"PLTE", b"tRNS", b"iCCP"):
+                self._ancillary[chunk_type] = data
+            elif chunk_type == b"IEND":
+                raise ValueError("PNG file without image data")
+
+    @staticmethod
+    def get_size(path: Path | str) -> tuple[int, int] | None:
+        """Get the size of a PNG file that can be read in bands, or None if the file is not supported"""
+        try:
+            with open(path, "rb") as f:
+                reader = PNGBandReader(f)
+        except (OSError, ValueError, struct.error):
+            return None
+        return reader.width, reader.height
+
+    @property
+    def icc_profile_chunk(self) -> bytes | None:
+        """The content of the iCCP chunk (if any), which can be passed to :class:`PNGBandWriter`"""
+        return self._ancillary.get(b"iCCP")
+
+    def _compressed_data(self) -> Iterator[bytes]:
+        """Read the content of all IDAT chunks, in pieces of at most :data:`_READ_SIZE` bytes"""
+        while self._pending_idat:
+            while self._pending_idat:
+                n = min(self._pending_idat, _READ_SIZE)
+                yield self._file.read(n)
+                self._pending_idat -= n
+            self._file.read(4)  # CRC
+            length, chunk_type = struct.unpack(">I4s", self._file.read(8))
+            if chunk_type == b"IDAT":
+                self._pending_idat = length
+
+    def bands(self, rows: int) -> Iterator[Image.Image]:
+        """Decode the image in bands of `rows` rows (the last band can be smaller), converted to RGBA"""
+        decompressor = zlib.decompressobj()
+        pieces = self._compressed_data()
+        buf = bytearray()
+        prev_row: bytes | None = None
+        for y in range(0, self.height, rows):
+            n = min(rows, self.height - y)
+            need = n * (self._stride + 1)
+            while len(buf) < need:
+                data = decompressor.unconsumed_tail or next(pieces, b"")
+                if not data:
+                    raise ValueError("PNG image data is truncated")
+                buf += decompressor.decompress(data, need - len(buf))
+            filtered = bytes(buf[:need])
+            del buf[:need]
+
+            if prev_row is not None:
+                filtered = b"\x00" + prev_row + filtered
+            img = Image.open(io.BytesIO(self._mini_png(filtered, n + (prev_row is not None))))
+            img.load()
+            prev_row = img.crop((0, img.height - 1, self.width, img.height)).tobytes()
+            band = img.convert("RGBA")
+            yield band.crop((0, img.height - n, self.width, img.height)) if img.height > n else band
+
+    def _mini_png(self, filtered: bytes, height: int) -> bytes:
+        """Build a self-contained PNG file with `height` rows from filtered image data"""
+        ihdr = struct.pack(">II", self.width, height) + self._ihdr[8:]
+        chunks = [_chunk(b"IHDR", ihdr)]
+        chunks += [_chunk(t, self._ancillary[t]) for t in (b"PLTE", b"tRNS") if t in self._ancillary]
+        chunks += [_chunk(b"IDAT", zlib.compress(filtered, 0)), _chunk(b"IEND", b"")]
+        return PNG_SIGNATURE + b"".join(chunks)
+
+
+class PNGBandWriter:
+    """
+    Encode an RGBA PNG file from bands of rows.
+
+    Parameters
+    ----------
+    file
+        A binary file object to write to
+    width, height
+        Size of the image
+    icc_profile_chunk
+        Content of an iCCP chunk to include, see :attr:`PNGBandReader.icc_profile_chunk`
+    compress_level
+        zlib compression level (the same default as Pillow)
+    """
+
+    def __init__(
+        self, file: BinaryIO, width: int, height: int, *, icc_profile_chunk: bytes | None = None, compress_level=6
+    ):
+        self._file = file
+        self.width = width
+        self.height = height
+        self._rows_written = 0
+        self._prev_row: Image.Image | None = None
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+        file.write(PNG_SIGNATURE + _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)))
+        if icc_profile_chunk is not None:
+            file.write(_chunk(b"iCCP", icc_profile_chunk))
+
+    def write(self, band: Image.Image):
+        """Append a band of rows (in RGBA mode) to the image"""
+        if band.mode != "RGBA" or band.width != self.width:
+            raise ValueError("Bands must be RGBA images with the width of the image")
+        if self._prev_row is None:
+            img = band
+        else:
+            img = Image.new("RGBA", (self.width, band.height + 1))
+            img.paste(self._prev_row, (0, 0))
+            img.paste(band, (0, 1))
+        # let Pillow choose the filters, but don't compress, as the bands are compressed as a single stream below
+        buf = io.BytesIO()
+        img.save(buf, "PNG", compress_level=0)
+        filtered = zlib.decompress(_read_idat(buf.getvalue()))
+        if self._prev_row is not None:
+            filtered = filtered[self.width * 4 + 1 :]
+        self._pending += self._compressor.compress(filtered)
+        self._flush_idat()
+        self._prev_row = band.crop((0, band.height - 1, self.width, band.height))
+        self._rows_written += band.height
+
+    def _flush_idat(self, final: bool = False):
+        while len(self._pending) >= _IDAT_SIZE or (final and self._pending):
+            self._file.write(_chunk(b"IDAT", bytes(self._pending[:_IDAT_SIZE])))
+            del self._pending[:_IDAT_SIZE]
+
+    def close(self):
+        """Finish writing the image"""
+        if self._rows_written != self.height:
+            raise ValueError(f"Expected {self.height} rows, but {self._rows_written} were written")
+        self._pending += self._compressor.flush()
+        self._flush_idat(final=True)
+        self._file.write(_chunk(b"IEND", b""))
@@ -9,7 +9,7 @@ from contextlib import contextmanager
 from pathlib import Path
 from textwrap import dedent, indent
 
-from ruamel.yaml import YAML
+from ._yaml import get_yaml
 
 
 def render_quarto(
@@ -96,7 +96,7 @@ def quarto_config_yml(quarto_config: dict | None, quarto_dir: Path):
     if quarto_config is None:
         quarto_config = {}
     config_file = quarto_dir / "_quarto.yml"
-    yaml = YAML(typ="safe")
+    yaml = get_yaml("safe")
     yaml.dump(quarto_config, config_file)
     try:
         yield
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 import json
+import os
+import stat
 import subprocess
 import sys
+import tempfile
 import tomllib
-from collections.abc import Sequence
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
 from functools import cache
 from os import environ
 from pathlib import Path
+from typing import IO
 
 from rich.prompt import Confirm
 
@@ -109,6 +114,90 @@ def git_list_files(dir: Path) -> list[Path]:
     return [dir / Path(p) for p in res.stdout.decode("utf-8").strip().split("\n")]
 
 
+def git_changed_files(dir: Path, *, since: str | None = None, staged: bool = False) -> list[Path]:
+    """
+    List all files in the git repository of `dir` that changed.
+
+    Parameters
+    ----------
+    dir
+        A directory within the git repository
+    since
+        List files that differ between the given git revision and the working tree, including untracked files
+        that are not .gitignored.
+    staged
+        List files that are staged for the next commit (i.e. differ between HEAD and the index).
+
+    Renamed files are reported under both their old and new name.
+    """
+    if (since is None) == (not staged):
+        raise ValueError("Exactly one of `since` and `staged` must be specified.")
+    res = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=dir, capture_output=True)
+    if res.returncode:
+        log.error(f"Failed to list changed files: {res.stderr.decode('utf-8').strip()}")
+        sys.exit(1)
+    top_level = Path(os.fsdecode(res.stdout).strip())
+
+    cmds = [["git", "diff", "--name-only", "--no-renames", "-z", *(["--cached"] if staged else [since, "--"])]]
+    if since is not None:
+        cmds.append(["git", "ls-files", "-z", "--others", "--exclude-standard"])
+    files = set()
+    for cmd in cmds:
+        res = subprocess.run(cmd, cwd=top_level, capture_output=True)
+        if res.returncode:
+            log.error(f"Failed to list changed files: {res.stderr.decode('utf-8').strip()}")
+            sys.exit(1)
+        files.update(top_level / p for p in os.fsdecode(res.stdout).split("\0") if p)
+    return sorted(files)
+
+
+def _git_ls_files(dir: Path, *args: str) -> list[str] | None:
+    """
+    Run `git ls-files` with `args` in `dir` and return the listed paths relative to `dir`.
+
+    Returns None if `dir` is not within a git working tree or git is not available.
+    """
+    try:
+        res = subprocess.run(["git", "ls-files", "-z", *args], cwd=dir, capture_output=True)
+    except OSError:
+        return None
+    if res.returncode:
+        return None
+    return [p for p in os.fsdecode(res.stdout).split("\0") if p]
+
+
+def git_glob(dir: Path, pattern: str) -> list[Path] | None:
+    """
+    Recursively find all files in `dir` that match the glob `pattern` and are not .gitignored.
+
+    Like :func:`git_list_files`, this lists both files that are tracked and untracked by git. Because git
+    doesn't descend into ignored directories, this is a lot faster than `Path.glob` in projects with large
+    (ignored) data or output directories. Tracked files that were deleted from the working tree are not included.
+
+    Returns None if `dir` is not within a git working tree or git is not available.
+    """
+    files = _git_ls_files(dir, "--cached", "--others", "--exclude-standard", "--", f":(glob){pattern}")
+    if files is None:
+        return None
+    return sorted(f for f in {dir / p for p in files} if f.is_file())
+
+
+def git_list_existing_files(dir: Path) -> set[Path] | None:
+    """
+    List all files in `dir` that are tracked or untracked (but not ignored) by git and exist in the working tree.
+
+    Unlike :func:`git_glob`, this doesn't check the existence of each file on the file system. Instead, tracked files
+    that were deleted from the working tree are excluded based on the git index.
+
+    Returns None if `dir` is not within a git working tree or git is not available.
+    """
+    files = _git_ls_files(dir, "--cached", "--others", "--exclude-standard")
+    deleted = _git_ls_files(dir, "--deleted")
+    if files is None or deleted is None:
+        return None
+    return {dir / p for p in set(files) - set(deleted)}
+
+
 @cache
 def get_dso_config_from_pyproject_toml(dir: Path) -> dict:
     """
@@ -126,6 +215,85 @@ def get_dso_config_from_pyproject_toml(dir: Path) -> dict:
     return data.get("tool", {}).get("dso", {})
 
 
+def get_cache_dir(project_root: Path, *subdirs: str) -> Path:
+    """
+    Get a directory for cached data in `.dso/cache` within the project root, creating it if necessary.
+
+    Everything in the cache directory is generated by dso and can be safely deleted at any time. A `.gitignore`
+    file is placed in the cache directory to ensure its contents are never tracked by git.
+    """
+    cache_dir = project_root / ".dso" / "cache"
+    if not (cache_dir / ".gitignore").exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        (cache_dir / ".gitignore").write_text("# Created automatically by dso\n*\n")
+    if subdirs:
+        cache_dir = cache_dir.joinpath(*subdirs)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+_DEFAULT_UMASK = 0o022
+"""Umask assumed if it cannot be read without modifying it, i.e. new files are not writable by group and others"""
+
+
+def _get_umask() -> int:
+    """
+    Get the umask of the current process
+
+    The umask is read from `/proc/self/status` (Linux). It is never read by temporarily setting it with `os.umask`:
+    the umask is process-wide, such that files created concurrently by other threads would not be restricted by it.
+    Where `/proc` is not available, :data:`_DEFAULT_UMASK` is returned.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    return _DEFAULT_UMASK
+
+
+@contextmanager
+def open_atomic(path: Path) -> Iterator[IO[bytes]]:
+    """
+    Open a temporary file for writing that replaces `path` once the context exits without an exception.
+
+    This ensures that concurrent readers never see a partially written file, and that `path` is left unchanged
+    if writing fails. It can also be used to write a file that is read at the same time, e.g. to modify a file
+    in place. The permissions of an existing file are preserved, new files are created with the default
+    permissions according to the umask.
+    """
+    try:
+        mode = stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_get_umask()
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", delete=False) as f:
+        try:
+            yield f
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    try:
+        os.chmod(f.name, mode)
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """
+    Write `data` to `path` atomically.
+
+    The data is written to a temporary file in the same directory first and then moved to its final location,
+    see :func:`open_atomic`.
+    """
+    with open_atomic(path) as f:
+        f.write(data)
+
+
 def _read_dot_dso_json(dir: Path):
     """
     Read .dso.json from the project directory
@@ -0,0 +1,250 @@
+"""Watch mode for `dso compile-config`: recompile configs as soon as their inputs change"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import time
+from collections.abc import Sequence
+from pathlib import Path
+
+from dso._logging import log
+from dso._metadata import __version__
+from dso._util import _find_in_parent_abs, get_cache_dir, get_dso_config_from_pyproject_toml, write_atomic
+
+WATCH_MARKER = "watch.json"
+"""Name of the file in the dso cache directory that signals a running `dso compile-config --watch` process"""
+
+POLL_INTERVAL = 1.0
+"""Interval (in seconds) in which the watched files are checked for changes"""
+
+HEARTBEAT_INTERVAL = 5.0
+"""Interval (in seconds) in which the watch process updates the heartbeat in the marker file"""
+
+HEARTBEAT_TIMEOUT = 3 * HEARTBEAT_INTERVAL
+"""A watch process is considered dead if it didn't update its heartbeat for this many seconds"""
+
+
+def _pid_alive(pid: int) -> bool:
+    """Check if a process with the given pid is running on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # the process exists, but belongs to a different user
+        return True
+    except OSError:
+        # e.g. on Windows, where signal 0 is not supported
+        return True
+    return True
+
+
+def _read_watch_marker(project_root: Path) -> dict | None:
+    """Read the watch marker from the dso cache directory, if it exists"""
+    try:
+        with (project_root / ".dso" / "cache" / WATCH_MARKER).open("rb") as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return marker if isinstance(marker, dict) else None
+
+
+def is_watched(path: Path, project_root: Path) -> bool:
+    """
+    Check if the configs of `path` are kept up-to-date by a healthy `dso compile-config --watch` process.
+
+    This is the case if a watch process of the same dso version is running, recently updated its heartbeat,
+    watches a parent directory of `path` and its last compilation succeeded.
+
+    Note that changes are only picked up by the watch process within :data:`POLL_INTERVAL`.
+    """
+    marker = _read_watch_marker(project_root)
+    if marker is None or not marker.get("ok") or marker.get("dso_version") != __version__:
+        return False
+    try:
+        if time.time() - float(marker["heartbeat"]) > HEARTBEAT_TIMEOUT:
+            return False
+        if marker["hostname"] == socket.gethostname() and not _pid_alive(int(marker["pid"])):
+            return False
+        watched_paths = [project_root / p for p in marker["paths"]]
+    except (KeyError, TypeError, ValueError):
+        return False
+    path = path.resolve()
+    return any(path.is_relative_to(p) for p in watched_paths)
+
+
+class ConfigWatcher:
+    """
+    Keep the compiled configs of `paths` up-to-date by polling their inputs for changes.
+
+    The parsed configs are kept in memory between polls. When a `params.in.yaml` file is modified, added or removed,
+    only that file is parsed again and only the configs in its directory and subdirectories are recompiled.
+    When `pyproject.toml` changes, all configs are recompiled. When a `!path` target appears or disappears, the configs
+    referencing it are recompiled (i.e. the warnings about missing paths are updated). Finally, configs are recompiled
+    if their `params.yaml` was modified or deleted.
+
+    While the watcher is running, it publishes a marker in the dso cache directory (see :func:`is_watched`). As the
+    watcher updates the compile manifest, `dso get-config` and `read_params` usually find the configuration up-to-date
+    and don't need to compile it. Changes the watcher didn't pick up yet are still compiled by them.
+
+    Parameters
+    ----------
+    paths
+        The resolved directories to watch
+    project_root
+        The project root of all paths
+    """
+
+    def __init__(self, paths: Sequence[Path], project_root: Path):
+        self.paths = list(paths)
+        self.project_root = project_root
+        self._config_tree = None
+        self._snapshot: dict[Path, object] = {}
+        # (stage, path) of all !path objects of the watched configs, mapped to the configs referencing them
+        self._path_targets: dict[Path, set[Path]] = {}
+        # whether the last compilation succeeded
+        self._ok = False
+        # after a failure, all configs are compiled again on the next change
+        self._compile_all = True
+        self._last_heartbeat = 0.0
+
+    def _list_configs(self) -> set[Path]:
+        from dso._compile_config import _get_list_of_configs_to_compile
+
+        # the config files in parent directories may have changed since the last poll
+        _find_in_parent_abs.cache_clear()
+        return _get_list_of_configs_to_compile(self.paths, self.project_root)
+
+    def _take_snapshot(self, configs: set[Path]) -> dict[Path, object]:
+        """Record the state of all inputs and outputs. Files are compared by modification time and size."""
+        snapshot: dict[Path, object] = {}
+        for file in [self.project_root / "pyproject.toml", *configs, *(c.parent / "params.yaml" for c in configs)]:
+            try:
+                st = file.stat()
+                snapshot[file] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                snapshot[file] = None
+        for target in self._path_targets:
+            snapshot[target] = target.exists()
+        return snapshot
+
+    def _update_path_targets(self, configs: set[Path]):
+        """Read the !path objects of all configs from the compile manifest"""
+        from dso._compile_config import _read_compile_manifest
+
+        manifest = _read_compile_manifest(self.project_root)
+        self._path_targets = {}
+        for config in configs:
+            entry = manifest.get(str(config.relative_to(self.project_root)), {})
+            for stage, path, _ in entry.get("paths", []):
+                self._path_targets.setdefault(self.project_root / stage / path, set()).add(config)
+
+    def _get_dirs_to_compile(self, changed: set[Path]) -> list[Path]:
+        """Get the directories that need to be recompiled after `changed` files changed"""
+        if self._compile_all or self.project_root / "pyproject.toml" in changed:
+            return self.paths
+        dirs = set()
+        for file in changed:
+            if file.name in ("params.in.yaml", "params.yaml"):
+                dirs.add(file.parent)
+            for config in self._path_targets.get(file, ()):
+                dirs.add(config.parent)
+        # directories of removed configs may have been removed as well
+        dirs = {next(d for d in [dir, *dir.parents] if d.is_dir()) for dir in dirs}
+        # compile_all_configs doesn't handle paths outside of the project
+        return sorted(d for d in dirs if d.is_relative_to(self.project_root))
+
+    def _compile(self, dirs: Sequence[Path], changed: set[Path], configs: set[Path]):
+        from dso._compile_config import _compile_all_configs, _ConfigTree
+
+        if self._config_tree is None or self.project_root / "pyproject.toml" in changed:
+            get_dso_config_from_pyproject_toml.cache_clear()
+            dso_config = get_dso_config_from_pyproject_toml(self.project_root)
+            self._config_tree = _ConfigTree(configs, relative=dso_config.get("use_relative_paths", True))
+        else:
+            if set(self._config_tree.all_configs) != configs:
+                self._config_tree.set_configs(configs)
+            for file in changed:
+                if file.name == "params.in.yaml":
+                    self._config_tree.invalidate(file)
+        if dirs:
+            _compile_all_configs(dirs, jobs=1, config_tree=self._config_tree)
+
+    def poll(self) -> bool:
+        """
+        Check for changes and recompile the affected configs.
+
+        Returns
+        -------
+        True if configs were recompiled
+        """
+        configs = self._list_configs()
+        snapshot = self._take_snapshot(configs)
+        changed = {f for f in snapshot.keys() | self._snapshot.keys() if snapshot.get(f) != self._snapshot.get(f)}
+        if not changed:
+            return False
+
+        dirs = self._get_dirs_to_compile(changed)
+        self._snapshot = snapshot
+        try:
+            self._compile(dirs, changed, configs)
+        except (Exception, SystemExit) as e:  # noqa: BLE001
+            # keep on watching, the user is likely in the middle of editing a file
+            log.error(f"Failed to compile configs: {e}")
+            self._ok = False
+            self._compile_all = True
+            self._config_tree = None
+        else:
+            self._ok = True
+            self._compile_all = False
+            self._update_path_targets(configs)
+            # don't consider params.yaml files written by ourselves as changes
+            self._snapshot.update(self._take_snapshot(configs))
+        self.heartbeat(force=True)
+        return True
+
+    def heartbeat(self, *, force: bool = False):
+        """Update the marker file in the dso cache directory, at most every :data:`HEARTBEAT_INTERVAL` seconds"""
+        now = time.time()
+        if not force and now - self._last_heartbeat < HEARTBEAT_INTERVAL:
+            return
+        marker = {
+            "pid": os.getpid(),
+            "hostname": socket.gethostname(),
+            "dso_version": __version__,
+            "heartbeat": now,
+            "ok": self._ok,
+            "paths": [str(p.relative_to(self.project_root)) for p in self.paths],
+        }
+        write_atomic(get_cache_dir(self.project_root) / WATCH_MARKER, json.dumps(marker).encode("utf-8"))
+        self._last_heartbeat = now
+
+    def remove_marker(self):
+        """Remove the marker file, unless it was overwritten by another watch process"""
+        marker = _read_watch_marker(self.project_root)
+        if marker is not None and marker.get("pid") == os.getpid() and marker.get("hostname") == socket.gethostname():
+            (self.project_root / ".dso" / "cache" / WATCH_MARKER).unlink(missing_ok=True)
+
+
+def watch_configs(paths: Sequence[Path], project_root: Path, *, interval: float = POLL_INTERVAL):
+    """
+    Watch `paths` and recompile configs whenever their inputs change, until interrupted.
+
+    See :class:`ConfigWatcher` for details. The configs are expected to be compiled once before starting to watch,
+    such that the first poll only needs to check which configs are up-to-date.
+    """
+    watcher = ConfigWatcher(paths, project_root)
+    log.info(
+        f"Watching {', '.join(f'./{p.relative_to(project_root)}' for p in paths)} for changes. Press Ctrl+C to stop."
+    )
+    try:
+        while True:
+            watcher.poll()
+            watcher.heartbeat()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        log.info("Stopped watching for changes.")
+    finally:
+        watcher.remove_marker()
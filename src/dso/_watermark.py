@@ -2,15 +2,21 @@
 
 import io
 from abc import abstractmethod
+from collections.abc import Mapping
 from dataclasses import dataclass
+from functools import lru_cache
 from importlib import resources
 from pathlib import Path
-from typing import cast
+from typing import IO, cast
 
 from PIL import Image, ImageColor, ImageDraw, ImageFont
-from pypdf import PdfReader, PdfWriter
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject, IndirectObject, NameObject
 
 from dso import assets
+from dso._logging import log
+from dso._png_stream import PNGBandReader, PNGBandWriter
+from dso._util import open_atomic
 
 
 @dataclass
@@ -71,79 +77,174 @@ class Watermarker:
         self.font_color = font_color
         self.font_outline_color = font_outline_color
 
+    def _get_options(self) -> dict:
+        """The watermark settings in a hashable form, e.g. as key for caches that are shared between instances"""
+        return {
+            "text": self.text,
+            "tile_size": tuple(self.tile_size),
+            "font_size": self.font_size,
+            "font_outline": self.font_outline,
+            "font_color": self.font_color,
+            "font_outline_color": self.font_outline_color,
+        }
+
     @abstractmethod
     def apply_and_save(self, input_image: Path | str, output_image: Path | str):
         """Apply the watermark to an image"""
         ...
 
     @staticmethod
-    def add_watermark(input_image: Path | str, output_image: Path | str, **kwargs):
-        """Add watermark to an image, using the different implementations base on the file type"""
-        input_image = Path(input_image)
-        ext = input_image.suffix
+    def get_class(input_image: Path | str) -> type["Watermarker"]:
+        """Get the implementation that handles the file type of `input_image`"""
+        ext = Path(input_image).suffix
         if ext == ".svg":
-            wm = SVGWatermarker(**kwargs)
+            return SVGWatermarker
         elif ext == ".pdf":
-            wm = PDFWatermarker(**kwargs)
+            return PDFWatermarker
         else:
-            wm = PILWatermarker(**kwargs)
+            return PILWatermarker
 
+    @staticmethod
+    def add_watermark(input_image: Path | str, output_image: Path | str, **kwargs):
+        """Add watermark to an image, using the different implementations base on the file type"""
+        wm = Watermarker.get_class(input_image)(**kwargs)
         wm.apply_and_save(input_image, output_image)
 
 
+BAND_HEIGHT = 256
+"""Minimum height (in pixels) of the bands in which :class:`PILWatermarker` composites the watermark onto images"""
+
+STREAMING_MIN_PIXELS = 4096 * 4096
+"""PNG images with at least this many pixels are watermarked band by band with bounded memory"""
+
+SVG_READ_SIZE = 1 << 20
+"""
+Number of bytes that :class:`SVGWatermarker` reads from the input file at once. Files with more than this many bytes
+of comments after the end of the root element are watermarked via an element tree.
+"""
+
+
+@lru_cache(maxsize=1)
+def _get_font_data() -> bytes:
+    """Read the watermark font (once per process)"""
+    return resources.files(assets).joinpath("open_sans.ttf").read_bytes()
+
+
+@lru_cache(maxsize=16)
+def _get_font(font_size: int) -> ImageFont.FreeTypeFont:
+    """Load the watermark font in the given size"""
+    return ImageFont.truetype(io.BytesIO(_get_font_data()), font_size)
+
+
+@lru_cache(maxsize=32)
+def _render_watermark_tile(
+    text: str,
+    tile_size: tuple[int, int],
+    font_size: int,
+    font_outline: int,
+    font_color: str,
+    font_outline_color: str,
+) -> Image.Image:
+    """Render a watermark tile, see :meth:`PILWatermarker._get_watermark_tile`. The result must not be modified."""
+    img = Image.new("RGBA", tile_size, color=(255, 255, 255, 0))
+
+    d = ImageDraw.Draw(img)
+    font = _get_font(font_size)
+
+    # Add text in top left corner
+    d.text(
+        (10, 10),
+        text,
+        anchor="lt",
+        fill=font_color,
+        font=font,
+        stroke_width=font_outline,
+        stroke_fill=font_outline_color,
+    )
+
+    # Add text in bottom right corner
+    d.text(
+        (tile_size[0] - 10, tile_size[1] / 2 + font_size),
+        text,
+        anchor="rm",
+        fill=font_color,
+        font=font,
+        stroke_width=font_outline,
+        stroke_fill=font_outline_color,
+    )
+
+    return img
+
+
+# full-size overlays are large (e.g. 48 MB for a 4000x3000 image), therefore only few of them are kept
+@lru_cache(maxsize=4)
+def _render_watermark_overlay(size: tuple[int, int], **tile_options) -> Image.Image:
+    """Tile a watermark overlay of the given size, see :meth:`PILWatermarker.get_watermark_overlay`"""
+    watermark = _render_watermark_tile(**tile_options)
+    tile_w, tile_h = tile_options["tile_size"]
+    width, height = size
+    # Build a single row of tiles by doubling the filled width with each paste (O(log n) pastes). The filled width
+    # is always a multiple of the tile width, which preserves the pattern.
+    row = Image.new("RGBA", (width, min(tile_h, height)))
+    row.paste(watermark, (0, 0))
+    filled = tile_w
+    while filled < width:
+        row.paste(row.crop((0, 0, filled, row.height)), (filled, 0))
+        filled *= 2
+    if row.height == height:
+        return row
+    watermark_tiled = Image.new("RGBA", size)
+    for y in range(0, height, tile_h):
+        watermark_tiled.paste(row, (0, y))
+
+    return watermark_tiled
+
+
 class PILWatermarker(Watermarker):
-    """Add watermarks to any image supported by Pillow"""
+    """
+    Add watermarks to any image supported by Pillow
+
+    The font, the watermark tile and the overlays of recently used image sizes are cached per process and shared
+    between instances with the same settings, e.g. for the many same-sized figures of a report.
+    """
 
     def get_watermark_overlay(self, size: tuple[int, int]) -> Image.Image:
-        """Generate an overlay with the watermark that has the same size as the base image"""
-        watermark = self._get_watermark_tile()
-        watermark_tiled = Image.new("RGBA", size)
-        for x in range(0, size[0], self.tile_size[0]):
-            for y in range(0, size[1], self.tile_size[1]):
-                watermark_tiled.paste(watermark, (x, y))
+        """
+        Generate an overlay with the watermark that has the same size as the base image
 
-        return watermark_tiled
+        The overlay is cached and must not be modified.
+        """
+        return _render_watermark_overlay(tuple(size), **self._get_options())
 
     def _get_watermark_tile(self) -> Image.Image:
         """Get a tile of predefined size that contains the watermark text twice
 
         (once top left corner, once middle right - this leads to a regular pattern)
-        """
-        img = Image.new("RGBA", self.tile_size, color=(255, 255, 255, 0))
-
-        d = ImageDraw.Draw(img)
-        with resources.open_binary(assets, "open_sans.ttf") as watermark_font:
-            font = ImageFont.truetype(watermark_font, self.font_size)
-
-        # Add text in top left corner
-        d.text(
-            (10, 10),
-            self.text,
-            anchor="lt",
-            fill=self.font_color,
-            font=font,
-            stroke_width=self.font_outline,
-            stroke_fill=self.font_outline_color,
-        )
-
-        # Add text in bottom right corner
-        d.text(
-            (self.tile_size[0] - 10, self.tile_size[1] / 2 + self.font_size),
-            self.text,
-            anchor="rm",
-            fill=self.font_color,
-            font=font,
-            stroke_width=self.font_outline,
-            stroke_fill=self.font_outline_color,
-        )
 
-        return img
+        The tile is cached and must not be modified.
+        """
+        return _render_watermark_tile(**self._get_options())
 
     def apply_and_save(self, input_image: Path | str, output_image: Path | str):
-        """Apply the watermark to an image and save it to the specified output file"""
-        base_image = Image.open(input_image).convert("RGBA")
-        watermark_overlay = self.get_watermark_overlay(base_image.size)
-        combined = Image.alpha_composite(base_image, watermark_overlay)
+        """
+        Apply the watermark to an image and save it to the specified output file
+
+        The watermark is composited onto the image in place, in horizontal bands that are a multiple of the tile height.
+        Therefore, only an overlay of the size of one band is needed rather than a full-size overlay and a full-size
+        copy of the result.
+        """
+        if self._can_stream(input_image, output_image):
+            self._apply_and_save_streaming(input_image, output_image)
+            return
+
+        with Image.open(input_image) as img:
+            combined = img.convert("RGBA")
+        width, height = combined.size
+        tile_h = self.tile_size[1]
+        band_h = tile_h * -(-BAND_HEIGHT // tile_h)
+        band = self.get_watermark_overlay((width, min(band_h, height)))
+        for y in range(0, height, band_h):
+            combined.alpha_composite(band, dest=(0, y), source=(0, 0, width, min(band_h, height - y)))
 
         try:
             combined.save(output_image)
@@ -151,6 +252,31 @@ class PILWatermarker(Watermarker):
             # e.g. OSError: cannot write mode RGBA as JPEG
             combined.convert("RGB").save(output_image)
 
+    @staticmethod
+    def _can_stream(input_image: Path | str, output_image: Path | str) -> bool:
+        """Check if an image is large enough to be watermarked with bounded memory, and if its format supports it"""
+        if Path(output_image).suffix.lower() != ".png" or Path(input_image).resolve() == Path(output_image).resolve():
+            return False
+        size = PNGBandReader.get_size(input_image)
+        return size is not None and size[0] * size[1] >= STREAMING_MIN_PIXELS
+
+    def _apply_and_save_streaming(self, input_image: Path | str, output_image: Path | str):
+        """
+        Apply the watermark to a PNG image, decoding, watermarking and encoding it band by band.
+
+        Only one band of the image is held in memory at a time, see :mod:`dso._png_stream`.
+        """
+        tile_h = self.tile_size[1]
+        band_h = tile_h * -(-BAND_HEIGHT // tile_h)
+        with open(input_image, "rb") as fin, open(output_image, "wb") as fout:
+            reader = PNGBandReader(fin)
+            writer = PNGBandWriter(fout, reader.width, reader.height, icc_profile_chunk=reader.icc_profile_chunk)
+            overlay = self.get_watermark_overlay((reader.width, min(band_h, reader.height)))
+            for band in reader.bands(band_h):
+                band.alpha_composite(overlay, source=(0, 0, band.width, band.height))
+                writer.write(band)
+            writer.close()
+
 
 class SVGWatermarker(Watermarker):
     """Add watermarks to SVG images using native SVG text elements with a tiling pattern."""
@@ -165,20 +291,112 @@ class SVGWatermarker(Watermarker):
             raise ValueError(f"Cannot parse SVG length: {value!r}")
         return float(m.group(1))
 
-    def _get_dimensions(self, root) -> tuple[float, float]:
-        """Return (width, height) from the SVG root element."""
-        w = root.get("width")
-        h = root.get("height")
+    def _get_dimensions(self, root_attrs: Mapping[str, str]) -> tuple[float, float]:
+        """Return (width, height) from the attributes of the SVG root element."""
+        w = root_attrs.get("width")
+        h = root_attrs.get("height")
         if w is not None and h is not None:
             return self._parse_svg_length(w), self._parse_svg_length(h)
-        vb = root.get("viewBox")
+        vb = root_attrs.get("viewBox")
         if vb:
             parts = vb.split()
             return float(parts[2]), float(parts[3])
         raise ValueError("Watermarking requires SVG images that define an explicit width/height or viewBox")
 
     def apply_and_save(self, input_image: Path | str, output_image: Path | str):
-        """Apply the watermark to an image and save it to the specified output file"""
+        """
+        Apply the watermark to an image and save it to the specified output file
+
+        The SVG file is read once, in chunks, and copied to the output unchanged, except for the watermark pattern and
+        overlay that are inserted before the end tag of the root element. The file is checked for well-formedness by
+        expat, but never loaded into an element tree, which keeps watermarking large SVG files (e.g. scatterplots with
+        many points) fast and the memory usage bounded. A self-closing root element is expanded to hold the watermark.
+        Files that can't be processed this way (e.g. UTF-16 encoded files) are watermarked via an element tree instead,
+        see :meth:`_apply_and_save_etree`.
+        """
+        import re
+        from xml.parsers import expat
+
+        root: tuple[str, dict[str, str], int] | None = None
+        empty_root = False
+        encoding = "utf-8"
+        parser = expat.ParserCreate()
+
+        def _xml_decl(_version, decl_encoding, _standalone):
+            nonlocal encoding
+            encoding = decl_encoding or encoding
+
+        def _start_root(name, attrs):
+            nonlocal root
+            root = (name, attrs, parser.CurrentByteIndex)
+            parser.StartElementHandler = _start_child
+            parser.EndElementHandler = _end_empty_root
+
+        def _start_child(_name, _attrs):
+            # only the root element is of interest, expat parses the rest without calling back into Python
+            parser.StartElementHandler = parser.EndElementHandler = None
+
+        def _end_empty_root(_name):
+            nonlocal empty_root
+            empty_root = True
+            parser.StartElementHandler = parser.EndElementHandler = None
+
+        parser.XmlDeclHandler = _xml_decl
+        parser.StartElementHandler = _start_root
+
+        with open(input_image, "rb") as fin, open_atomic(Path(output_image)) as fout:
+            # the end tag of the root element is found in the last chunks of the file, which are held back
+            tail = bytearray()
+            flushed = 0
+            head = b""
+            while chunk := fin.read(SVG_READ_SIZE):
+                head = head or chunk[:4]
+                parser.Parse(chunk, False)
+                tail += chunk
+                if len(tail) > 2 * SVG_READ_SIZE:
+                    fout.write(tail[:-SVG_READ_SIZE])
+                    flushed += len(tail) - SVG_READ_SIZE
+                    del tail[:-SVG_READ_SIZE]
+            parser.Parse(b"", True)
+            assert root is not None  # expat raises an error for documents without a root element
+
+            root_tag, root_attrs, root_start = root
+            position = None
+            if _is_ascii_compatible(encoding) and _is_ascii_compatible_bom(head):
+                tag = re.escape(root_tag.encode(encoding))
+                end_tag = re.search(rb"</" + tag + rb"\s*>(?:\s|<!--.*?-->|<\?.*?\?>)*\Z", tail, re.DOTALL)
+                if end_tag is not None:
+                    position = end_tag.start()
+                elif empty_root and root_start >= flushed:
+                    # self-closing root element `<svg ... />`, which is expanded to `<svg ...>watermark</svg>`
+                    start_tag = re.compile(rb"<" + tag + rb"""(?:[^>"']|"[^"]*"|'[^']*')*?/>""").match(
+                        tail, root_start - flushed
+                    )
+                    if start_tag is not None:
+                        position = start_tag.end() - 2
+                        tail[position:] = b"></" + root_tag.encode(encoding) + b">" + tail[start_tag.end() :]
+                        position += 1
+
+            if position is None:
+                log.debug(f"Could not stream {input_image}, falling back to parsing it into an element tree")
+                fout.seek(0)
+                fout.truncate()
+                self._apply_and_save_etree(input_image, fout)
+                return
+
+            prefix = root_tag.rpartition(":")[0]
+            watermark = self._get_watermark_markup(*self._get_dimensions(root_attrs), prefix=prefix)
+            fout.write(tail[:position])
+            fout.write(watermark.encode(encoding, errors="xmlcharrefreplace"))
+            fout.write(tail[position:])
+
+    def _apply_and_save_etree(self, input_image: Path | str, output: IO[bytes]):
+        """
+        Apply the watermark by parsing the entire SVG file into an element tree
+
+        Used as fallback for files that can't be streamed, i.e. in encodings that aren't ASCII-compatible. The output is
+        always UTF-8 encoded.
+        """
         import xml.etree.ElementTree as ET
 
         # Pre-register all namespaces so ElementTree preserves them in the output.
@@ -191,10 +409,20 @@ class SVGWatermarker(Watermarker):
 
         tree = ET.parse(input_image)
         root = tree.getroot()
+        uri = root.tag[1:].partition("}")[0] if root.tag.startswith("{") else ""
+        markup = self._get_watermark_markup(*self._get_dimensions(root.attrib))
+        root.extend(ET.fromstring(f'<watermark xmlns="{uri}">{markup}</watermark>'))
+        tree.write(output, xml_declaration=True, encoding="utf-8")
+
+    def _get_watermark_markup(self, width: float, height: float, *, prefix: str = "") -> str:
+        """
+        Build the SVG elements that add the watermark to an image of the given size
 
-        ns = root.tag.split("}")[0] + "}" if root.tag.startswith("{") else ""
+        `prefix` is the namespace prefix of the SVG namespace in the target document (usually none).
+        """
+        import xml.etree.ElementTree as ET
 
-        width, height = self._get_dimensions(root)
+        ns = f"{prefix}:" if prefix else ""
         tile_w, tile_h = self.tile_size
         fill = RGBAColor.from_string(self.font_color)
         stroke = RGBAColor.from_string(self.font_outline_color)
@@ -216,12 +444,7 @@ class SVGWatermarker(Watermarker):
             **stroke_attrs,
         }
 
-        # Add <defs> at the front if not present
-        defs = root.find(f"{ns}defs")
-        if defs is None:
-            defs = ET.Element(f"{ns}defs")
-            root.insert(0, defs)
-
+        defs = ET.Element(f"{ns}defs")
         pattern = ET.SubElement(
             defs,
             f"{ns}pattern",
@@ -257,8 +480,7 @@ class SVGWatermarker(Watermarker):
         text2.text = self.text
 
         # Overlay rect filling the full SVG canvas with the tiled pattern
-        ET.SubElement(
-            root,
+        rect = ET.Element(
             f"{ns}rect",
             {
                 "x": "0",
@@ -269,27 +491,104 @@ class SVGWatermarker(Watermarker):
             },
         )
 
-        tree.write(output_image, xml_declaration=True, encoding="utf-8")
+        return ET.tostring(defs, encoding="unicode") + ET.tostring(rect, encoding="unicode")
+
+
+def _is_ascii_compatible(encoding: str) -> bool:
+    """Check if ASCII characters (i.e. the XML markup of SVG files) are encoded as single ASCII bytes"""
+    try:
+        return "<?xml />".encode(encoding) == b"<?xml />"
+    except (LookupError, UnicodeError):
+        return False
+
+
+def _is_ascii_compatible_bom(start: bytes) -> bool:
+    """Check that the first bytes of an XML file don't indicate UTF-16 or UTF-32 (with or without byte order mark)"""
+    return not start.startswith((b"\xff\xfe", b"\xfe\xff")) and b"\x00" not in start
+
+
+def _pdf_stream(data: bytes) -> DecodedStreamObject:
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return stream
+
+
+@lru_cache(maxsize=32)
+def _render_pdf_watermark(page_size: tuple[float, float], **options) -> bytes:
+    """Build a single-page watermark PDF, see :meth:`PDFWatermarker._create_text_watermark_pdf`"""
+    return PDFWatermarker(**options)._create_text_watermark_pdf(*page_size)
 
 
 class PDFWatermarker(Watermarker):
-    """Add watermarks to PDF files using native PDF text operations."""
+    """
+    Add watermarks to PDF files using native PDF text operations.
+
+    The watermark PDFs of recently used page sizes are cached per process and shared between instances with the same
+    settings.
+    """
 
     def apply_and_save(self, input_image: Path | str, output_image: Path | str):
-        """Apply the watermark to an image and save it to the specified output file"""
-        reader = PdfReader(input_image)
-        writer = PdfWriter()
-        for page_obj in reader.pages:
-            page_width = float(page_obj.mediabox.width)
-            page_height = float(page_obj.mediabox.height)
-            pdf_bytes = self._create_text_watermark_pdf(page_width, page_height)
-            watermark_overlay_pdf = PdfReader(io.BytesIO(pdf_bytes)).pages[0]
-            writer.add_page(page_obj)
-            writer.pages[-1].merge_page(watermark_overlay_pdf)
-
-        with open(output_image, "wb") as f:
-            writer.write(f)
-        reader.close()
+        """
+        Apply the watermark to a PDF file and save it to the specified output file
+
+        The watermark of each page size is added to the output only once, as a form XObject, that is drawn by a small
+        content stream shared by all pages of that size. Unlike merging the watermark into each page, this neither
+        decodes nor re-encodes the content streams of the pages. This keeps the time and memory needed for documents
+        with thousands of pages low, and the output about as small as the input.
+        """
+        options = self._get_options()
+        with PdfReader(input_image) as reader:
+            writer = PdfWriter()
+            # isolate the graphics state of the page content from the watermark
+            begin = writer._add_object(_pdf_stream(b"q\n"))
+            watermarks: dict[tuple[float, float], tuple[NameObject, IndirectObject, IndirectObject]] = {}
+            for page in reader.pages:
+                page = writer.add_page(page)
+                page_size = (float(page.mediabox.width), float(page.mediabox.height))
+                if page_size not in watermarks:
+                    name = NameObject(f"/DSOWatermark{len(watermarks)}")
+                    xobject = self._add_watermark_xobject(writer, page_size, **options)
+                    end = writer._add_object(_pdf_stream(f"\nQ\nq {name} Do Q\n".encode()))
+                    watermarks[page_size] = name, xobject, end
+                name, xobject, end = watermarks[page_size]
+                self._add_watermark_to_page(page, name, xobject, begin, end)
+            with open(output_image, "wb") as f:
+                writer.write(f)
+
+    @staticmethod
+    def _add_watermark_xobject(writer: PdfWriter, page_size: tuple[float, float], **options) -> IndirectObject:
+        """Add the watermark for pages of the given size to `writer` as a form XObject, and return a reference to it"""
+        watermark = PdfReader(io.BytesIO(_render_pdf_watermark(page_size, **options))).pages[0]
+        xobject = _pdf_stream(watermark.get_contents().get_data())
+        xobject[NameObject("/Type")] = NameObject("/XObject")
+        xobject[NameObject("/Subtype")] = NameObject("/Form")
+        xobject[NameObject("/BBox")] = ArrayObject([FloatObject(0), FloatObject(0), *map(FloatObject, page_size)])
+        xobject[NameObject("/Resources")] = watermark["/Resources"].clone(writer)
+        return writer._add_object(xobject)
+
+    @staticmethod
+    def _add_watermark_to_page(
+        page: PageObject, name: NameObject, xobject: IndirectObject, begin: IndirectObject, end: IndirectObject
+    ):
+        """
+        Register the watermark XObject in the resources of `page` and draw it on top of the page content
+
+        `begin` and `end` are content streams that are added before and after the existing content streams of the page
+        """
+        resources = page.get("/Resources")
+        if resources is None:
+            resources = page[NameObject("/Resources")] = DictionaryObject()
+        resources = resources.get_object()
+        if "/XObject" not in resources:
+            resources[NameObject("/XObject")] = DictionaryObject()
+        resources["/XObject"].get_object()[name] = xobject
+
+        contents = page.get("/Contents")
+        if contents is None:
+            contents = ArrayObject()
+        elif not isinstance(contents.get_object(), ArrayObject):
+            contents = ArrayObject([contents])
+        page[NameObject("/Contents")] = ArrayObject([begin, *contents.get_object(), end])
 
     @staticmethod
     def _pdf_escape(text: str) -> str:
@@ -0,0 +1,126 @@
+"""Watermark many files with a pool of worker processes, see `dso watermark` with a directory or `--manifest`"""
+
+import json
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import IO
+
+from dso._watermark_server import WatermarkServer
+
+WATERMARK_EXTENSIONS = (".bmp", ".gif", ".jpeg", ".jpg", ".pdf", ".png", ".svg", ".tif", ".tiff", ".webp")
+"""Extensions of the files that are watermarked when a directory or glob pattern is given"""
+
+_GLOB_CHARS = frozenset("*?[")
+
+_server: WatermarkServer | None = None
+"""The watermark server of the current worker process, see :func:`_init_worker`"""
+
+
+def is_batch_input(input_image: str) -> bool:
+    """
+    Check if the input of `dso watermark` refers to multiple files, i.e. is a directory or a glob pattern.
+
+    The input is only considered a glob pattern if it doesn't exist as a literal path.
+    """
+    path = Path(input_image)
+    return path.is_dir() or (not path.exists() and any(c in _GLOB_CHARS for c in input_image))
+
+
+def find_batch(input_image: str, output_dir: Path) -> list[dict]:
+    """
+    Get watermark requests for all images in a directory (recursively) or matching a glob pattern.
+
+    The outputs are written to `output_dir`, at the same path relative to `output_dir` as the input relative to the
+    directory (or the part of the glob pattern that doesn't contain wildcards). Only files with one of the
+    :data:`WATERMARK_EXTENSIONS` are included.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the glob pattern doesn't match any files, e.g. because it is a mistyped file name
+    """
+    path = Path(input_image)
+    if path.is_dir():
+        base, pattern = path, "**/*"
+    else:
+        parts = path.parts
+        n_fixed = next(i for i, part in enumerate(parts) if any(c in _GLOB_CHARS for c in part))
+        base, pattern = Path(*parts[:n_fixed]), str(Path(*parts[n_fixed:]))
+    files = [p for p in base.glob(pattern) if p.is_file()]
+    if not files and not path.is_dir():
+        raise FileNotFoundError(f"No such file or directory, and no files match the pattern: {input_image}")
+    files = sorted(p for p in files if p.suffix.lower() in WATERMARK_EXTENSIONS)
+    return [{"input": str(p), "output": str(output_dir / p.relative_to(base))} for p in files]
+
+
+def read_manifest(manifest: IO[str]) -> list[dict]:
+    """
+    Read watermark requests from a manifest in the JSON lines format of `dso watermark --serve`.
+
+    Raises
+    ------
+    ValueError
+        If a line is not a JSON object
+    """
+    requests = []
+    for i, line in enumerate(manifest, start=1):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {i} of the manifest is not valid JSON: {e}") from None
+        if not isinstance(request, dict):
+            raise ValueError(f"Line {i} of the manifest is not a JSON object")
+        requests.append(request)
+    return requests
+
+
+def _init_worker(defaults: dict):
+    """Create the watermark server of a worker process, which keeps watermarkers (and their caches) between files"""
+    global _server
+    _server = WatermarkServer(**defaults)
+
+
+def _process(request: dict) -> dict:
+    """Process a single request in a worker process and add the input, output and time taken to the response"""
+    assert _server is not None
+    start = time.perf_counter()
+    if "output" in request:
+        Path(request["output"]).parent.mkdir(parents=True, exist_ok=True)
+    response = _server.handle(request)
+    return response | {
+        "input": request.get("input"),
+        "output": request.get("output"),
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def run_batch(requests: Iterable[dict], *, jobs: int = 1, **defaults) -> Iterator[dict]:
+    """
+    Process watermark requests (see :class:`~dso._watermark_server.WatermarkServer`) with `jobs` worker processes.
+
+    Each worker keeps its own `Watermarker` instances, such that fonts, tiles and overlays are reused for all files
+    with the same settings. Responses are yielded as the files are completed and additionally contain the `input` and
+    `output` paths and the time taken in `seconds`.
+
+    Parameters
+    ----------
+    requests
+        Watermark requests
+    jobs
+        Number of worker processes. With a single job, the files are processed in the current process.
+    defaults
+        Default watermark options for all requests
+    """
+    requests = list(requests)
+    if jobs == 1 or len(requests) <= 1:
+        _init_worker(defaults)
+        yield from map(_process, requests)
+        return
+    with ProcessPoolExecutor(min(jobs, len(requests)), initializer=_init_worker, initargs=(defaults,)) as pool:
+        futures = [pool.submit(_process, request) for request in requests]
+        for future in as_completed(futures):
+            yield future.result()
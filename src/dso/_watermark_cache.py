@@ -0,0 +1,135 @@
+"""Content-addressed cache of watermarked images, see :func:`add_watermark_cached`"""
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from dso._logging import log
+from dso._metadata import __version__
+from dso._util import get_cache_dir, get_dso_config_from_pyproject_toml, get_project_root, open_atomic
+from dso._watermark import Watermarker
+
+WATERMARK_CACHE_DIR = "watermark"
+"""Subdirectory of the dso cache directory in which watermarked images are stored"""
+
+DEFAULT_WATERMARK_CACHE_SIZE = 512
+"""Default maximum total size (in MB) of the watermark cache of a project"""
+
+_cache_sizes: dict[Path, int] = {}
+"""Estimated total size (in bytes) of each cache directory used by the current process, see :func:`_add_to_cache`"""
+_cache_sizes_lock = threading.Lock()
+
+
+def add_watermark_cached(input_image: Path | str, output_image: Path | str, *, project_path: Path, **kwargs):
+    """
+    Add a watermark to an image, reusing the result of a previous call with the same image content and settings.
+
+    Watermarked images are stored in the dso cache directory of the project, keyed by the hash of the input image, the
+    watermark settings (including defaults) and the dso version. Re-rendering a report with unchanged figures
+    therefore only copies the watermarked images from the cache. The least recently used images are deleted once
+    the cache exceeds `watermark_cache_size` MB (setting in `[tool.dso]`, `0` disables the cache).
+
+    Parameters
+    ----------
+    input_image, output_image
+        See :meth:`Watermarker.add_watermark <dso._watermark.Watermarker.add_watermark>`
+    project_path
+        A path within the project whose cache is used. If it is not within a dso project, no cache is used.
+    kwargs
+        Watermark settings, see :class:`~dso._watermark.Watermarker`
+    """
+    input_image, output_image = Path(input_image), Path(output_image)
+    try:
+        project_root = get_project_root(project_path.resolve())
+        max_size = float(
+            get_dso_config_from_pyproject_toml(project_root).get("watermark_cache_size", DEFAULT_WATERMARK_CACHE_SIZE)
+        )
+    except FileNotFoundError:
+        max_size = 0
+    if max_size <= 0:
+        Watermarker.add_watermark(input_image, output_image, **kwargs)
+        return
+
+    cache_dir = get_cache_dir(project_root, WATERMARK_CACHE_DIR)
+    entry = cache_dir / (_get_cache_key(input_image, output_image.suffix, kwargs) + output_image.suffix)
+    if entry.is_file():
+        try:
+            shutil.copyfile(entry, output_image)
+            # the modification time marks the entry as recently used, see `_evict`
+            os.utime(entry)
+            log.debug(f"Using cached watermarked image for {input_image}")
+            return
+        except FileNotFoundError:
+            # evicted concurrently
+            pass
+
+    Watermarker.add_watermark(input_image, output_image, **kwargs)
+    try:
+        with output_image.open("rb") as src, open_atomic(entry) as dest:
+            shutil.copyfileobj(src, dest)
+        _add_to_cache(cache_dir, entry.stat().st_size, int(max_size * 1024**2))
+    except OSError as e:
+        log.debug(f"Could not cache watermarked image for {input_image}: {e}")
+
+
+def _get_cache_key(input_image: Path, output_suffix: str, kwargs: dict) -> str:
+    """Hash the content of the input image, the normalized watermark settings and the dso version"""
+    cls = Watermarker.get_class(input_image)
+    with input_image.open("rb") as f:
+        content_hash = hashlib.file_digest(f, "sha256").hexdigest()
+    key = [__version__, cls.__name__, cls(**kwargs)._get_options(), input_image.suffix, output_suffix, content_hash]
+    return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+def _add_to_cache(cache_dir: Path, size: int, max_size: int):
+    """
+    Account for a new entry of `size` bytes and evict entries if the cache exceeds `max_size` bytes.
+
+    Listing the cache directory is only necessary once per process and cache directory, and whenever the estimated
+    size exceeds the maximum size. Entries written by other processes are only accounted for at that point, which
+    means the cache may temporarily exceed its maximum size if it is filled by multiple processes at the same time.
+    """
+    with _cache_sizes_lock:
+        if cache_dir in _cache_sizes:
+            total_size = _cache_sizes[cache_dir] + size
+        else:
+            total_size = sum(entry_size for _, entry_size, _ in _list_entries(cache_dir))
+        if total_size > max_size:
+            total_size = _evict(cache_dir, max_size)
+        _cache_sizes[cache_dir] = total_size
+
+
+def _list_entries(cache_dir: Path) -> list[tuple[float, int, str]]:
+    """List the `(mtime, size, path)` of all entries of the cache"""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        # skip temporary files of entries that are currently written, see `open_atomic`
+        if entry.name.startswith("."):
+            continue
+        with contextlib.suppress(FileNotFoundError):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+
+def _evict(cache_dir: Path, max_size: int) -> int:
+    """
+    Delete the least recently used entries of the cache until their total size is at most `max_size` bytes
+
+    Returns
+    -------
+    The total size of the remaining entries
+    """
+    entries = _list_entries(cache_dir)
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+        total_size -= size
+    return total_size
@@ -0,0 +1,98 @@
+"""Long-running watermark process, see `dso watermark --serve`"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import IO
+
+from dso._logging import log
+from dso._watermark import Watermarker
+
+WATERMARK_OPTIONS = ("text", "tile_size", "font_size", "font_outline", "font_color", "font_outline_color")
+"""Options of :class:`~dso._watermark.Watermarker` that can be set per request"""
+
+MAX_WATERMARKERS = 32
+"""Maximum number of `Watermarker` instances (i.e. distinct combinations of options) that are kept in memory"""
+
+
+class WatermarkServer:
+    """
+    Add watermarks to images on request, keeping `Watermarker` instances (and everything they cache) in memory.
+
+    Requests are read from a stream as JSON lines, each of them an object with the fields
+
+    * `id`: an arbitrary value that is included in the response to match it to the request
+    * `input`, `output`: paths to the input and output image
+    * optionally any of :data:`WATERMARK_OPTIONS`, overriding the defaults given to the server
+
+    For each request, a JSON line `{"id": ..., "ok": true}` or `{"id": ..., "ok": false, "error": "..."}` is written
+    to the output stream once the output image was written. Requests are processed concurrently, therefore responses
+    can arrive in a different order than the requests.
+
+    Parameters
+    ----------
+    jobs
+        Number of requests that are processed concurrently
+    defaults
+        Default watermark options for all requests
+    """
+
+    def __init__(self, *, jobs: int = 1, **defaults):
+        self.jobs = jobs
+        self.defaults = {k: v for k, v in defaults.items() if v is not None}
+        self._watermarkers: dict[tuple, Watermarker] = {}
+        self._lock = threading.Lock()
+
+    def get_watermarker(self, cls: type[Watermarker], options: dict) -> Watermarker:
+        """Get a (shared) watermarker instance of type `cls` with the given options"""
+        key = (cls, tuple(sorted(options.items())))
+        with self._lock:
+            if key not in self._watermarkers:
+                if len(self._watermarkers) >= MAX_WATERMARKERS:
+                    # drop the least recently created instance
+                    del self._watermarkers[next(iter(self._watermarkers))]
+                self._watermarkers[key] = cls(**options)
+            return self._watermarkers[key]
+
+    def handle(self, request: dict) -> dict:
+        """Process a single request and return the response"""
+        request_id = request.get("id")
+        try:
+            input_image = Path(request["input"])
+            output_image = Path(request["output"])
+            options = self.defaults | {k: request[k] for k in WATERMARK_OPTIONS if request.get(k) is not None}
+            if "tile_size" in options:
+                options["tile_size"] = tuple(options["tile_size"])
+            if options.get("text") is None:
+                raise ValueError("No watermark text specified")
+            wm = self.get_watermarker(Watermarker.get_class(input_image), options)
+            wm.apply_and_save(input_image, output_image)
+        except KeyError as e:
+            return {"id": request_id, "ok": False, "error": f"Missing field {e} in request"}
+        except Exception as e:  # noqa: BLE001
+            log.debug(f"Failed to watermark {request.get('input')}: {e}")
+            return {"id": request_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+        return {"id": request_id, "ok": True}
+
+    def serve(self, requests: IO[str], responses: IO[str]):
+        """Process requests from `requests` until it is closed, writing responses to `responses`"""
+        write_lock = threading.Lock()
+
+        def _respond(response: dict):
+            with write_lock:
+                responses.write(json.dumps(response) + "\n")
+                responses.flush()
+
+        with ThreadPoolExecutor(self.jobs) as pool:
+            for line in requests:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    _respond({"id": None, "ok": False, "error": f"Invalid request: {e}"})
+                    continue
+                pool.submit(lambda request=request: _respond(self.handle(request)))
@@ -0,0 +1,143 @@
+"""Reusable ruamel.yaml instances and cached loading of YAML files"""
+
+import datetime
+import hashlib
+import marshal
+import threading
+from pathlib import Path
+from typing import Any
+
+from ruamel.yaml import YAML
+
+from dso._logging import log
+from dso._metadata import __version__
+from dso._util import get_cache_dir, write_atomic
+
+YAML_CACHE_DIR = "yaml"
+"""Subdirectory of the dso cache directory in which parsed YAML files are stored, see :func:`load_yaml_cached`"""
+
+_local = threading.local()
+
+
+def get_yaml(typ: str = "rt", *, cls: type[YAML] = YAML) -> YAML:
+    """
+    Get a `YAML` instance of type `typ` (e.g. `"rt"` or `"safe"`) that is reused within the current thread.
+
+    Creating a `YAML` instance (and the loader, constructor and representer objects it sets up on first use) is
+    relatively expensive compared to loading or dumping small files. `YAML` instances are not thread-safe, therefore
+    each thread gets its own instance. Don't modify the settings of the returned instance, as they would affect all
+    other users.
+
+    Parameters
+    ----------
+    typ
+        The type of the YAML instance, see `ruamel.yaml.YAML`
+    cls
+        A subclass of `YAML` to instantiate, e.g. to use a custom constructor.
+    """
+    instances = getattr(_local, "instances", None)
+    if instances is None:
+        instances = _local.instances = {}
+    if (cls, typ) not in instances:
+        instances[cls, typ] = cls(typ=typ)
+    return instances[cls, typ]
+
+
+def _encode(value: Any) -> Any:
+    """
+    Convert the output of the safe loader to types supported by `marshal`.
+
+    Lists and dicts are converted recursively, other types that `marshal` doesn't support (or that would be ambiguous)
+    are stored as a `(tag, value)` tuple.
+
+    Raises
+    ------
+    TypeError
+        If `value` contains a type that can't be encoded
+    """
+    if value is None or type(value) in (bool, int, float, str, bytes):
+        return value
+    if type(value) is list:
+        return [_encode(x) for x in value]
+    if type(value) is dict:
+        return {_encode(k): _encode(v) for k, v in value.items()}
+    if type(value) is datetime.datetime:
+        return ("datetime", value.isoformat())
+    if type(value) is datetime.date:
+        return ("date", value.isoformat())
+    if type(value) is tuple:
+        return ("tuple", tuple(_encode(x) for x in value))
+    if type(value) is set:
+        return ("set", tuple(_encode(x) for x in value))
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def _decode(value: Any) -> Any:
+    """Reverse :func:`_encode`"""
+    if type(value) is list:
+        return [_decode(x) for x in value]
+    if type(value) is dict:
+        return {_decode(k): _decode(v) for k, v in value.items()}
+    if type(value) is tuple:
+        tag, data = value
+        if tag == "datetime":
+            return datetime.datetime.fromisoformat(data)
+        if tag == "date":
+            return datetime.date.fromisoformat(data)
+        if tag == "tuple":
+            return tuple(_decode(x) for x in data)
+        if tag == "set":
+            return {_decode(x) for x in data}
+        raise ValueError(f"Unknown tag {tag!r}")
+    return value
+
+
+def load_yaml_cached(path: Path, project_root: Path) -> Any:
+    """
+    Load a YAML file of the project with the safe loader, reusing the result of a previous load if possible.
+
+    The parsed content is stored in the dso cache directory with `marshal`, together with the hash of the file it was
+    parsed from. As long as the file content doesn't change, subsequent calls (e.g. `read_params` after restarting a
+    notebook kernel) load the cache entry instead of parsing the YAML file again. Each file has at most one cache entry.
+
+    Unlike `pickle`, loading a cache entry can't execute code. The cache directory may be writable by other users of
+    a shared project, therefore only plain data (see :func:`_encode`) is stored.
+
+    Parameters
+    ----------
+    path
+        Absolute path to the YAML file
+    project_root
+        The project root of `path`
+
+    Raises
+    ------
+    OSError
+        If `path` can't be read
+    """
+    data = path.read_bytes()
+    try:
+        rel_path = path.relative_to(project_root)
+    except ValueError:
+        return get_yaml("safe").load(data)
+
+    content_hash = hashlib.sha256(data).hexdigest()
+    cache_name = hashlib.sha256(str(rel_path).encode("utf-8")).hexdigest() + ".marshal"
+    try:
+        with (project_root / ".dso" / "cache" / YAML_CACHE_DIR / cache_name).open("rb") as f:
+            version, cached_hash, parsed = marshal.load(f)
+        if version == __version__ and cached_hash == content_hash:
+            return _decode(parsed)
+    except Exception:  # noqa: BLE001
+        # missing, truncated or otherwise invalid cache entry
+        pass
+
+    parsed = get_yaml("safe").load(data)
+    try:
+        write_atomic(
+            get_cache_dir(project_root, YAML_CACHE_DIR) / cache_name,
+            marshal.dumps((__version__, content_hash, _encode(parsed))),
+        )
+    except (TypeError, OSError) as e:
+        log.debug(f"Could not cache parsed ./{rel_path}: {e}")
+    return parsed
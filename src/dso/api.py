@@ -100,7 +100,7 @@ def read_params(stage: str | Path) -> dict:
     It is required to provide the path of the current stage relative to the project root to ensure that
     the correct config is loaded, no matter of the current working directory (as long as the working directory
     is any subdirectory of the project root). The function recompiles params.in.yaml to params.yaml on-the-fly
-    to ensure that up-to-date params are always loaded.
+    if it is out-of-date to ensure that up-to-date params are always loaded.
 
     Only parameters that are declared as `params`, `dep`, or `output` in dvc.yaml are loaded to
     ensure that one does not forget to keep the `dvc.yaml` updated.
@@ -123,7 +123,8 @@ def WatermarkedFile(output_file: Path | str, **kwargs):
     """
     Contextmanager that handles adding watermarks to files.
 
-    Currently supports SVG, PDF and all pixel graphics supported by pillow.
+    Currently supports SVG, PDF and all pixel graphics supported by pillow. Watermarked images are cached in the
+    project, such that re-creating an unchanged figure doesn't watermark it again.
 
     Parameters
     ----------
@@ -155,10 +156,10 @@ def WatermarkedFile(output_file: Path | str, **kwargs):
     if not watermark_config:
         yield output_file
     else:
-        from dso._watermark import Watermarker
+        from dso._watermark_cache import add_watermark_cached
 
         with NamedTemporaryFile(suffix=output_file.suffix) as f:
             try:
                 yield f.name
             finally:
-                Watermarker.add_watermark(f.name, output_file, **watermark_config)
+                add_watermark_cached(f.name, output_file, project_path=output_file.parent, **watermark_config)
@@ -0,0 +1,115 @@
+"""`dso compile-config` command"""
+
+import sys
+from pathlib import Path
+
+import rich_click as click
+
+from dso._logging import log
+from dso._util import get_project_root
+
+
+@click.command(name="compile-config")
+@click.option(
+    "--all",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Compile all configs in the project",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Recompile configs even if their inputs did not change since they were last compiled.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=0),
+    default=None,
+    help=(
+        "Number of processes for compiling configs in parallel. `0` uses all available CPUs. "
+        "Defaults to the `compile_jobs` setting in `[tool.dso]` in `pyproject.toml`, or `1` if it's not set."
+    ),
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help=(
+        "Keep running and recompile configs as soon as their inputs change. While running, "
+        "`dso get-config` and `read_params` skip compiling the configs."
+    ),
+)
+@click.option(
+    "--changed-since",
+    metavar="REV",
+    default=None,
+    help=(
+        "Only compile configs that are affected by `params.in.yaml` files changed since the given git revision "
+        "(e.g. `HEAD` or `origin/main`), including uncommitted and untracked files."
+    ),
+)
+@click.option(
+    "--staged",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Only compile configs that are affected by `params.in.yaml` files staged for commit (useful for pre-commit).",
+)
+@click.argument("args", nargs=-1, type=click.Path())
+def dso_compile_config(all, force, jobs, watch, changed_since, staged, args):
+    """Compile params.in.yaml into params.yaml using Jinja2 templating and resolving recursive templates.
+
+    If passing no arguments, configs will be resolved for the current working directory (i.e. all parent configs,
+    and all configs in child directories). Alternatively a list of paths can be specified. In that case, all configs
+    related to these paths will be compiled (useful for using with pre-commit).
+
+    Configs are only recompiled if any of their inputs (the config itself, its parent configs, the existence of
+    `!path` objects or the `[tool.dso]` settings) changed since they were last compiled.
+
+    With `--watch`, the configs are kept in memory and recompiled whenever a `params.in.yaml` file, `pyproject.toml`
+    or the existence of a `!path` target changes, until the process is interrupted.
+
+    With `--changed-since` or `--staged`, only configs are compiled whose own `params.in.yaml` or the
+    `params.in.yaml` of a parent directory changed according to git. If `pyproject.toml` changed, all configs
+    are compiled.
+    """
+    from dso._compile_config import _get_paths_affected_by_changes, compile_all_configs
+
+    if changed_since is not None and staged:
+        log.error("`--changed-since` and `--staged` are mutually exclusive.")
+        sys.exit(1)
+    if watch and (changed_since is not None or staged):
+        log.error("`--watch` can't be combined with `--changed-since` or `--staged`.")
+        sys.exit(1)
+
+    if all and not len(args):
+        paths = [get_project_root(Path.cwd())]
+    elif all:
+        paths = [get_project_root(Path(x)) for x in args]
+    elif not len(args):
+        paths = [Path.cwd()]
+    else:
+        paths = [Path(x) for x in args]
+
+    if changed_since is not None or staged:
+        from dso._util import check_project_roots, git_changed_files
+
+        project_root = check_project_roots(paths)
+        changed_files = git_changed_files(project_root, since=changed_since, staged=staged)
+        paths = _get_paths_affected_by_changes(paths, changed_files, project_root)
+        if not paths:
+            log.info("[green]No configs affected by changes.")
+            return
+
+    compile_all_configs(paths, force=force, jobs=jobs)
+    if watch:
+        from dso._util import check_project_roots
+        from dso._watch import watch_configs
+
+        paths = [p.parent.resolve() if p.is_file() else p.resolve() for p in paths]
+        watch_configs(paths, check_project_roots(paths))
@@ -0,0 +1,42 @@
+"""Wrappers around dvc commands that compile the configuration before running dvc"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import rich_click as click
+
+from dso._logging import log
+from dso._util import get_project_root
+
+
+def _dvc_wrapper(command: str):
+    @click.command(
+        name=command,
+        help=f"Wrapper around `dvc {command}`, compiling configuration before running.",
+        context_settings={"ignore_unknown_options": True},
+    )
+    @click.argument("args", nargs=-1, type=click.UNPROCESSED)
+    def command_wrapper(args):
+        """Wrapper around any dvc command, compiling configuration before running."""
+        from dso._compile_config import compile_all_configs
+        from dso._util import check_ask_pre_commit
+
+        check_ask_pre_commit(Path.cwd())
+        compile_all_configs([get_project_root(Path.cwd())])
+        os.environ["DSO_SKIP_COMPILE"] = "1"
+        # use `python -m dvc`` syntax to ensure we are using dvc from the same venv
+        cmd = [sys.executable, "-m", "dvc", command, *args]
+        log.debug(f"Running `{' '.join(cmd)}`")
+        res = subprocess.run(cmd)
+        sys.exit(res.returncode)
+
+    return command_wrapper
+
+
+dso_repro = _dvc_wrapper("repro")
+dso_pull = _dvc_wrapper("pull")
+dso_push = _dvc_wrapper("push")
+dso_checkout = _dvc_wrapper("checkout")
+dso_status = _dvc_wrapper("status")
@@ -2,9 +2,10 @@ import os
 from pathlib import Path
 
 import rich_click as click
-from ruamel.yaml import YAML
 
 from dso._logging import log
+from dso._util import get_project_root
+from dso._yaml import load_yaml_cached
 
 
 @click.command("quarto")
@@ -43,8 +44,8 @@ def dso_exec_quarto(stage: str, skip_compile: bool = True):
         os.environ["DSO_SKIP_COMPILE"] = (
             "1"  # no need to re-compile the config when calling `read_params` in the script
         )
-    yaml = YAML(typ="safe")
-    params = yaml.load(stage_dir / "params.yaml")
+    # also populates the cache for `read_params` in the script
+    params = load_yaml_cached(stage_dir / "params.yaml", get_project_root(stage_dir))
     dso_config = params.get("dso", {})
     if dso_config is None:
         dso_config = {}
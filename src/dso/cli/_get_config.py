@@ -0,0 +1,84 @@
+"""`dso get-config` command"""
+
+import os
+import sys
+from json import dump as json_dump
+from pathlib import Path
+
+import rich_click as click
+
+from dso._logging import log
+from dso._util import get_project_root
+from dso._yaml import get_yaml
+
+
+@click.command(name="get-config")
+@click.option(
+    "--all",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Include all parameters, not only those mentioned in `dvc.yaml`",
+)
+@click.option(
+    "--all-stages",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Get the configuration of all stages in the project.",
+)
+@click.option(
+    "--skip-compile",
+    is_flag=True,
+    type=bool,
+    default=bool(int(os.environ.get("DSO_SKIP_COMPILE", 0))),
+    help="Do not compile configs before loading it. The same can be achieved by setting the `DSO_SKIP_COMPILE=1` env var.",
+)
+@click.option(
+    "--json",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help="Output config in json format.",
+)
+@click.argument(
+    "stages",
+    nargs=-1,
+    type=click.Path(),
+)
+def dso_get_config(stages, all, all_stages, skip_compile, json):
+    """Get the configuration for a given stage and print it to STDOUT in yaml or json format.
+
+    The path to the stage must be relative to the root dir of the project.
+
+    By default, the configuration is filtered to include only the keys that are mentioned in `dvc.yaml` to force
+    declaring all dependencies.
+
+    If multiple stages are defined in a single `dvc.yaml`, the stage name MUST be specified using
+    `path/to/stage:stage_name` unless `--all` is given.
+
+    If multiple stages (or `--all-stages`) are given, a single document mapping each stage to its configuration
+    is printed. This is a lot faster than calling `dso get-config` for each stage.
+    """
+    from dso._get_config import find_stages, get_configs
+
+    if all_stages and stages:
+        log.error("Stages cannot be specified together with `--all-stages`.")
+        sys.exit(1)
+    if not all_stages and not stages:
+        log.error("At least one stage must be specified (or use `--all-stages`).")
+        sys.exit(1)
+    if all_stages:
+        stages = find_stages(get_project_root(Path.cwd()))
+
+    try:
+        out_config = get_configs(stages, all=all, skip_compile=skip_compile)
+        if len(stages) == 1 and not all_stages:
+            out_config = out_config[stages[0]]
+        if json:
+            json_dump(out_config, sys.stdout, indent=4)  # Output the config in JSON format
+        else:
+            get_yaml().dump(out_config, sys.stdout)  # Output the config in YAML format
+    except KeyError as e:
+        log.error(f"dvc.yaml defines parameter {e} that is not in params.yaml")
+        sys.exit(1)
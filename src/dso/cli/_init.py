@@ -0,0 +1,54 @@
+"""`dso init` command"""
+
+import sys
+from os import getcwd
+from pathlib import Path
+from textwrap import dedent
+
+import rich_click as click
+from rich.prompt import Confirm
+
+from dso._logging import log
+from dso._templates import get_instantiate_template_help_text, instantiate_with_repo, prompt_for_template_params
+
+
+@click.argument("name", required=False)
+@click.option("--library", "-l", "library_id", help="Choose the template library to use")
+@click.option(
+    "--template", "-t", "template_id", help="Specify the id of a template to use from the specified template library"
+)
+@click.command(
+    "init",
+    help=dedent("""\
+    Initialize a new DSO project. This sets up a git repository and creates all necessary configuration
+    files for git, dvc, uv and dso itself.\n
+    If you wish to initialize DSO in an existing project, you can specify an existing directory. In
+    this case, it will initialize files from the template that do not exist yet, but never overwrite existing files.\n
+    """)
+    + get_instantiate_template_help_text("project"),
+    context_settings={
+        "ignore_unknown_options": True,
+        "allow_extra_args": True,
+    },
+)
+@click.pass_context
+def dso_init(ctx, name: str | None, *, template_id: str | None = None, library_id: str | None = None):
+    """Initialize a new project. A project can contain several stages organized in arbitrary subdirectories."""
+    from dso._compile_config import compile_all_configs
+
+    # get extra arguments, see https://stackoverflow.com/questions/32944131/add-unspecified-options-to-cli-command-using-python-click
+    params = {ctx.args[i][2:]: ctx.args[i + 1] for i in range(0, len(ctx.args), 2)}
+    if name is not None:
+        params["name"] = name
+
+    template, params = prompt_for_template_params("init", library_id, template_id, **params)
+
+    target_dir = Path(getcwd()) / params["name"]
+
+    if target_dir.exists():
+        if not Confirm.ask("[bold]Directory already exists. Do you want to initialize DSO in an existing project?"):
+            sys.exit(1)
+
+    instantiate_with_repo(template["path"], target_dir, **params)
+    log.info("[green]Project initalized successfully.")
+    compile_all_configs([target_dir])
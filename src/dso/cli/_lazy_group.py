@@ -0,0 +1,38 @@
+"""A click group that imports its subcommands on demand"""
+
+from importlib import import_module
+
+import rich_click as click
+
+
+class LazyGroup(click.RichGroup):
+    """
+    Click group whose subcommands are only imported when they are invoked.
+
+    Importing a command module typically imports all dependencies of that command (e.g. PIL for `dso watermark`).
+    Loading them lazily keeps the startup time of the CLI independent of the number of commands. Listing all
+    commands (e.g. for `dso --help`) still imports all of them.
+
+    Parameters
+    ----------
+    lazy_subcommands
+        Maps command names to the import path of the command object in the form `module.path:attribute`.
+    """
+
+    def __init__(self, *args, lazy_subcommands: dict[str, str] | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted({*super().list_commands(ctx), *self.lazy_subcommands})
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+        if cmd_name in self.lazy_subcommands:
+            return load_command(self.lazy_subcommands[cmd_name])
+        return super().get_command(ctx, cmd_name)
+
+
+def load_command(import_path: str) -> click.Command:
+    """Import a command object from an import path in the form `module.path:attribute`"""
+    module_name, attr = import_path.split(":")
+    return getattr(import_module(module_name), attr)
@@ -0,0 +1,42 @@
+"""`dso lint` command"""
+
+import os
+
+import rich_click as click
+
+
+@click.command(name="lint")
+@click.option(
+    "--skip-compile",
+    help="Do not compile configs before linting. The same can be achieved by setting the `DSO_SKIP_COMPILE=1` env var.",
+    type=bool,
+    default=bool(int(os.environ.get("DSO_SKIP_COMPILE", 0))),
+    is_flag=True,
+)
+@click.argument("args", nargs=-1, type=click.Path())
+def dso_lint(args, skip_compile: bool = False):
+    """Lint a dso project
+
+    TODO: Linting is currently disabled because of its slow speed with only one rule implemented. See #70, #5, and #66
+    on GitHub for more information.
+
+    Performs consistency checks according to a set of rules.
+
+    If passing no arguments, linting will be performed for the current working directory. Alternatively a list of paths
+    can be specified. In that case, all stages related to any of the files are linted (useful for using with pre-commit).
+
+    Configurations are compiled before linting.
+    """
+    # TODO linting is temporarily disabled because it's slow and basically no checks are implemented
+    # See #70, #5 and #66
+    pass
+    # from dso._compile_config import compile_all_configs
+    # from dso._lint import lint
+
+    # if not len(args):
+    #     paths = [Path.cwd()]
+    # else:
+    #     paths = [Path(x) for x in args]
+    # if not skip_compile:
+    #     compile_all_configs(paths)
+    # lint(paths)
@@ -0,0 +1,52 @@
+"""`dso mv` command"""
+
+import sys
+from pathlib import Path
+
+import rich_click as click
+
+from dso._logging import log
+from dso._mv import increment_prefixes, mv
+
+
+@click.command(name="mv")
+@click.argument(
+    "source",
+    type=click.Path(exists=True, file_okay=True, dir_okay=True, path_type=Path),
+)
+@click.argument(
+    "target",
+    type=click.Path(file_okay=True, dir_okay=True, path_type=Path),
+    required=False,
+)
+@click.option(
+    "--increment-prefix",
+    "-i",
+    help=("Increments the prefix for source stage or folder and subsequent items."),
+    default=None,
+)
+def dso_mv(source: Path, target: Path | None, increment_prefix: str | None):
+    """
+    Move or rename a stage or folder and update all references (experimental).
+
+    This command lets you move or rename a stage or folder in your project. All references to the moved or renamed item
+    in files like `dvc.yaml`, `params.in.yaml`, and source files will be updated automatically.
+    Note: references inside the target itself are not updated and must be changed manually.
+
+    You can also use this command to increment the numeric prefix of a stage or folder and all subsequent items.
+    For example, running `dso mv 01_preprocessing --increment-prefix 02` will rename `01_preprocessing` to `02_preprocessing`,
+    `02_analysis` to `03_analysis`, and so on. Prefixes can include both numbers and letters, such as `A0101`, `A0102`, etc.
+
+    You must specify either a target path (to move/rename) or use the `--increment-prefix` option (to increment prefixes),
+    but not both at the same time.
+    """
+    if (target is None and increment_prefix is None) or (target is not None and increment_prefix is not None):
+        log.error("Either target or increment need to be specified, but not both.")
+        sys.exit(1)
+    elif target is not None and increment_prefix is None:
+        mv(source, target)
+    elif target is None and increment_prefix is not None:
+        increment_prefixes(source, increment_prefix)
+    else:
+        log.error(f"Invalid state reached with: target '{target}' and increment_prefix '{increment_prefix}'.")
+        sys.exit(1)
@@ -0,0 +1,148 @@
+"""`dso watermark` command"""
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import IO
+
+import rich_click as click
+
+from dso._logging import log
+
+
+@click.command(name="watermark")
+@click.argument("input_image", type=click.Path(), required=False)
+@click.argument("output_image", type=click.Path(), required=False)
+@click.option("--text", help="Text to use as watermark. Required unless `--serve` is given.")
+@click.option(
+    "--tile_size",
+    type=(int, int),
+    help="watermark text will be arranged in tile of this size (once at top left, once at middle right). Specify the tile size as e.g. `120 80`",
+)
+@click.option("--font_size", type=int)
+@click.option("--font_outline", type=int)
+@click.option("--font_color", help="Use RGBA (e.g. `#AAAAAA88`) to specify transparency")
+@click.option("--font_outline_color", help="Use RGBA (e.g. `#AAAAAA88`) to specify transparency")
+@click.option(
+    "--serve",
+    is_flag=True,
+    type=bool,
+    default=False,
+    help=(
+        "Keep running and process watermark requests read from STDIN as JSON lines, instead of watermarking a "
+        "single image. The other options are used as defaults for all requests."
+    ),
+)
+@click.option(
+    "--manifest",
+    type=click.File("r"),
+    help=(
+        "Watermark all images listed in this file (or `-` for STDIN), one JSON object per line in the request format "
+        "of `--serve`, instead of a single image."
+    ),
+)
+@click.option(
+    "--report",
+    type=click.File("w"),
+    help="Write the result and time taken for each image as JSON lines to this file (or `-` for STDOUT).",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=None,
+    help=(
+        "Number of images processed concurrently with `--serve`, `--manifest` or multiple input images. "
+        "Defaults to the number of CPUs."
+    ),
+)
+def dso_watermark(input_image, output_image, text, serve, manifest, report, jobs, **kwargs):
+    """Add a watermark to an image
+
+    To be called from the dso-r package for implementing a custom graphics device.
+    Can also be used standalone for watermarking images.
+
+    If `INPUT_IMAGE` is a directory or a glob pattern (e.g. `"figures/**/*.png"`, quoted to prevent expansion by the
+    shell), all images within the directory or matching the pattern are watermarked with a pool of worker processes
+    and written to the directory `OUTPUT_IMAGE`, at the same relative path. Alternatively, input and output images
+    can be listed in a `--manifest`. Failures are reported at the end, and the exit code is 1 if any image failed.
+
+    With `--serve`, a long-running process reads requests like
+    `{"id": 1, "input": "in.png", "output": "out.png", "text": "DRAFT"}` from STDIN (one JSON object per line) and
+    writes a response like `{"id": 1, "ok": true}` (or `{"id": 1, "ok": false, "error": "..."}`) to STDOUT as soon as
+    the image was written. Requests can override any of the watermark options. As fonts and watermark tiles are kept
+    in memory, this is a lot faster than calling `dso watermark` for each image.
+    """
+    kwargs = {k: v for k, v in kwargs.items() if v is not None}
+
+    if serve:
+        from dso._watermark_server import WatermarkServer
+
+        if input_image is not None or output_image is not None or manifest is not None:
+            log.error("Input and output images cannot be specified together with `--serve`.")
+            sys.exit(1)
+        WatermarkServer(jobs=jobs or os.cpu_count() or 1, text=text, **kwargs).serve(sys.stdin, sys.stdout)
+        return
+
+    if manifest is not None:
+        from dso._watermark_batch import read_manifest
+
+        if input_image is not None or output_image is not None:
+            log.error("Input and output images cannot be specified together with `--manifest`.")
+            sys.exit(1)
+        try:
+            requests = read_manifest(manifest)
+        except ValueError as e:
+            log.error(str(e))
+            sys.exit(1)
+        _watermark_batch(requests, report, jobs=jobs or os.cpu_count() or 1, text=text, **kwargs)
+        return
+
+    if input_image is None or output_image is None or text is None:
+        log.error(
+            "`INPUT_IMAGE`, `OUTPUT_IMAGE` and `--text` are required (unless `--serve` or `--manifest` is given)."
+        )
+        sys.exit(1)
+
+    from dso._watermark_batch import find_batch, is_batch_input
+
+    if is_batch_input(input_image):
+        if Path(output_image).is_file():
+            log.error("`OUTPUT_IMAGE` must be a directory if multiple input images are given.")
+            sys.exit(1)
+        try:
+            requests = find_batch(input_image, Path(output_image))
+        except FileNotFoundError as e:
+            log.error(str(e))
+            sys.exit(1)
+        if not requests:
+            log.error(f"No images found in {input_image}.")
+            sys.exit(1)
+        _watermark_batch(requests, report, jobs=jobs or os.cpu_count() or 1, text=text, **kwargs)
+        return
+
+    from dso._watermark import Watermarker
+
+    Watermarker.add_watermark(Path(input_image), Path(output_image), text=text, **kwargs)
+
+
+def _watermark_batch(requests: list[dict], report: IO[str] | None, *, jobs: int, **defaults):
+    """Watermark multiple images, log a summary and write the per-file results to `report`"""
+    from dso._watermark_batch import run_batch
+
+    start = time.perf_counter()
+    results = list(run_batch(requests, jobs=jobs, **defaults))
+
+    failed = [r for r in results if not r["ok"]]
+    for r in failed:
+        log.error(f"Failed to watermark {r['input']}: {r['error']}")
+    if report is not None:
+        for r in results:
+            report.write(json.dumps(r) + "\n")
+    log.info(
+        f"Watermarked {len(results) - len(failed)} of {len(results)} images in {time.perf_counter() - start:.1f}s."
+    )
+    if failed:
+        sys.exit(1)
@@ -2,14 +2,19 @@
 Pandocfilter that add watermarks to quarto reports
 
  * warning box at the top
- * watermark to all PNG images
+ * watermark to all images
+
+Images are collected while walking the document and watermarked concurrently once the walk is complete.
 
 Called internally by `dso exec quarto` via `python -m dso.pandocfilter`.
 """
 
+import os
 import sys
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
+from itertools import repeat
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 from textwrap import dedent
@@ -18,7 +23,7 @@ import PIL
 from panflute import Div, Image, RawBlock, run_filter
 
 from dso._logging import log
-from dso._watermark import Watermarker
+from dso._watermark_cache import add_watermark_cached
 
 
 def _get_disclaimer_box(title, text):
@@ -51,6 +56,13 @@ def prepare(doc):
         div = Div(RawBlock(_get_disclaimer_box(disclaimer_title, disclaimer_text), format="html"))
         doc.content.insert(0, div)
 
+    doc.watermark_config = _sanitize_watermark_config(doc.get_metadata("watermark"))
+    # could be "" or None, both which evaluate to False
+    if doc.watermark_config and "text" not in doc.watermark_config:
+        log.error("Need to specify at least `watermark.text`")
+        sys.exit(1)
+    doc.watermark_images = []
+
 
 def _sanitize_watermark_config(config):
     """Parse values to integer where appropriate"""
@@ -71,26 +83,43 @@ def _sanitize_watermark_config(config):
 
 
 def action(elem, doc):
-    """Panflutes action"""
-    watermark_config = _sanitize_watermark_config(doc.get_metadata("watermark"))
-    if watermark_config:  # could be "" or None, both which evaluate to False
-        if "text" not in watermark_config:
-            log.error("Need to specify at least `watermark.text`")
-            sys.exit(1)
-        if isinstance(elem, Image):
-            try:
-                log.debug(f"Modifying image {elem.url}")
-                path = Path(urllib.parse.unquote(elem.url))
-                # use a temporary file to add the watermark, otherwise the original file may be modified inplace
-                out_path = NamedTemporaryFile(delete=False, suffix=path.suffix).name
-                Watermarker.add_watermark(path, out_path, **watermark_config)
-                elem.url = urllib.parse.quote(out_path)
-
-            except PIL.UnidentifiedImageError:
-                log.warning("Image could not be read by PIL. It will not receive a watermark.")
-
+    """Panflutes action. Only collects the images, which are watermarked in :func:`finalize`."""
+    if doc.watermark_config and isinstance(elem, Image):
+        doc.watermark_images.append(elem)
     return elem
 
 
+def _watermark_image(path: Path, watermark_config: dict) -> str | None:
+    """Add a watermark to a copy of an image and return the path of the copy, or None if the image can't be read"""
+    log.debug(f"Modifying image {path}")
+    # use a temporary file to add the watermark, otherwise the original file may be modified inplace
+    out_path = NamedTemporaryFile(delete=False, suffix=path.suffix).name
+    try:
+        add_watermark_cached(path, out_path, project_path=path.parent, **watermark_config)
+    except PIL.UnidentifiedImageError:
+        log.warning(f"Image {path} could not be read by PIL. It will not receive a watermark.")
+        return None
+    return out_path
+
+
+def finalize(doc):
+    """
+    Panflutes finalize. Watermarks all images collected by :func:`action` concurrently and updates their URLs.
+
+    Images that are included multiple times are only watermarked once.
+    """
+    paths = {elem.url: Path(urllib.parse.unquote(elem.url)) for elem in doc.watermark_images}
+    if not paths:
+        return
+    # Pillow releases the GIL while decoding, compositing and encoding images, therefore threads are sufficient
+    with ThreadPoolExecutor(min(len(paths), os.cpu_count() or 1)) as pool:
+        out_paths = dict(
+            zip(paths, pool.map(_watermark_image, paths.values(), repeat(doc.watermark_config)), strict=True)
+        )
+    for elem in doc.watermark_images:
+        if out_paths[elem.url] is not None:
+            elem.url = urllib.parse.quote(out_paths[elem.url])
+
+
 if __name__ == "__main__":
-    run_filter(action, prepare=prepare, doc=None)
+    run_filter(action, prepare=prepare, finalize=finalize, doc=None)
@@ -1,9 +1,36 @@
+import subprocess
+import sys
+from textwrap import dedent
+
 from click.testing import CliRunner
 
-from dso.cli import dso
+from dso.cli import COMMANDS, dso
 
 
 def test_root_command():
     runner = CliRunner()
     result = runner.invoke(dso)
     assert result.exit_code == 0
+
+
+def test_commands_are_loaded_lazily():
+    code = dedent(
+        """\
+        import sys
+        from dso.cli import dso
+
+        heavy = ["dso.api", "dso._templates", "dso._mv", "dso._compile_config", "ruamel.yaml", "PIL", "dso.cli._create"]
+        print([m for m in heavy if m in sys.modules])
+        """
+    )
+    res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert res.stdout.strip() == "[]"
+
+
+def test_list_commands():
+    runner = CliRunner()
+    result = runner.invoke(dso, ["--help"])
+    assert result.exit_code == 0
+    for command in COMMANDS:
+        assert command in result.output
+        assert dso.get_command(None, command).name == command
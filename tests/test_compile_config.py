@@ -1,3 +1,5 @@
+import os
+import subprocess
 from functools import partial
 from io import StringIO
 from pathlib import Path
@@ -9,10 +11,16 @@ import yaml
 from click.testing import CliRunner
 from ruamel.yaml import YAML
 
+from dso import _compile_config
 from dso._compile_config import (
+    _ConfigTree,
     _get_list_of_configs_to_compile,
     _get_parent_configs,
+    _index_configs,
     _load_yaml_with_auto_adjusting_paths,
+    _PathExistsCache,
+    compile_all_configs,
+    is_config_up_to_date,
 )
 from dso.cli import dso_compile_config
 
@@ -73,6 +81,24 @@ def test_auto_adjusting_path(tmp_path, interpolate, relative):
         assert actual.split() == ["my_path:", f"{tmp_path}/test.txt"]
 
 
+def test_auto_adjusting_path_reuses_yaml(tmp_path):
+    """The same loader and !path class are used for all files, each path keeps the location of its own file"""
+    (tmp_path / ".git").mkdir()
+    (tmp_path / "A").mkdir()
+    (tmp_path / "params.in.yaml").write_text("p: !path root.txt\n")
+    (tmp_path / "A" / "params.in.yaml").write_text("p: !path a.txt\n")
+
+    docs = []
+    for file in [tmp_path / "params.in.yaml", tmp_path / "A" / "params.in.yaml"]:
+        with file.open() as f:
+            docs += _load_yaml_with_auto_adjusting_paths(f, destination=tmp_path / "A", missing_path_warnings=None)
+
+    assert type(docs[0]["p"]) is type(docs[1]["p"])
+    assert [str(d["p"]) for d in docs] == [os.path.join("..", "root.txt"), "a.txt"]
+    # the !path tag is not registered for other round-trip loaders
+    assert YAML().load("p: !path root.txt")["p"].tag.value == "!path"
+
+
 @pytest.mark.parametrize("relative", [True, False])
 @pytest.mark.parametrize(
     "test_yaml,expected",
@@ -192,7 +218,7 @@ def test_get_parent_configs(tmp_path, current_config, expected):
         ]
     }
 
-    res = _get_parent_configs(current_config, all_configs)
+    res = _get_parent_configs(current_config, _index_configs(all_configs))
     assert res == expected
 
 
@@ -269,3 +295,313 @@ def test_get_list_of_configs_to_compile(tmp_path, paths, expected):
 
     res = _get_list_of_configs_to_compile(paths, tmp_path)
     assert sorted(res) == sorted(expected)
+
+
+def test_get_list_of_configs_to_compile_gitignore(tmp_path):
+    """In a git repository, configs in .gitignored directories are not discovered"""
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    (tmp_path / ".gitignore").write_text("output/\n")
+    for x in ["params.in.yaml", "A/params.in.yaml", "output/params.in.yaml", "output/B/params.in.yaml"]:
+        (tmp_path / x).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / x).touch()
+    subprocess.run(["git", "add", "params.in.yaml"], cwd=tmp_path, check=True)
+
+    res = _get_list_of_configs_to_compile([tmp_path], tmp_path)
+    assert sorted(res) == [tmp_path / "A/params.in.yaml", tmp_path / "params.in.yaml"]
+
+    # tracked files that were deleted from the working tree are ignored
+    (tmp_path / "params.in.yaml").unlink()
+    res = _get_list_of_configs_to_compile([tmp_path / "A"], tmp_path)
+    assert sorted(res) == [tmp_path / "A/params.in.yaml"]
+
+
+def test_get_list_of_configs_to_compile_gitignore_explicit(tmp_path):
+    """Configs in explicitly requested directories are discovered, even if they are .gitignored"""
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    (tmp_path / ".gitignore").write_text("output/\nC/params.in.yaml\n")
+    for x in ["params.in.yaml", "output/B/params.in.yaml", "C/params.in.yaml", "C/D/params.in.yaml"]:
+        (tmp_path / x).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / x).touch()
+
+    # the requested directory itself is .gitignored
+    res = _get_list_of_configs_to_compile([tmp_path / "output/B"], tmp_path)
+    assert sorted(res) == [tmp_path / "output/B/params.in.yaml", tmp_path / "params.in.yaml"]
+    # only the config in the requested directory is .gitignored
+    res = _get_list_of_configs_to_compile([tmp_path / "C"], tmp_path)
+    assert sorted(res) == [tmp_path / "C/D/params.in.yaml", tmp_path / "C/params.in.yaml", tmp_path / "params.in.yaml"]
+
+    # and recompiled after changes
+    _setup_yaml_configs(tmp_path, {"params.in.yaml": {}, "output/B/params.in.yaml": {"b": 1}})
+    compile_all_configs([tmp_path / "output/B"])
+    assert yaml.safe_load((tmp_path / "output/B/params.yaml").read_text()) == {"b": 1}
+    _setup_yaml_configs(tmp_path, {"output/B/params.in.yaml": {"b": 2}})
+    compile_all_configs([tmp_path / "output/B"])
+    assert yaml.safe_load((tmp_path / "output/B/params.yaml").read_text()) == {"b": 2}
+
+
+@pytest.mark.parametrize("staged", [False, True])
+def test_compile_configs_changed(tmp_path, monkeypatch, staged):
+    """Only configs affected by changed params.in.yaml files are compiled"""
+
+    def git(*args):
+        subprocess.run(["git", "-c", "user.name=x", "-c", "user.email=x@x", *args], cwd=tmp_path, check=True)
+
+    def compiled():
+        return sorted(str(p.parent.relative_to(tmp_path)) for p in tmp_path.glob("**/params.yaml"))
+
+    git("init", "-q")
+    _setup_yaml_configs(
+        tmp_path,
+        {
+            "params.in.yaml": {"value": "root"},
+            "A/params.in.yaml": {"value": "A"},
+            "A/B/params.in.yaml": {"value": "B"},
+            "C/params.in.yaml": {"value": "C"},
+            "D/params.in.yaml": {"value": "D"},
+        },
+    )
+    (tmp_path / "pyproject.toml").touch()
+    git("add", ".")
+    git("commit", "-q", "-m", "init")
+    monkeypatch.chdir(tmp_path)
+    args = ["--staged"] if staged else ["--changed-since", "HEAD"]
+
+    runner = CliRunner()
+    result = runner.invoke(dso_compile_config, args)
+    assert result.exit_code == 0
+    assert compiled() == []
+
+    _setup_yaml_configs(tmp_path, {"A/params.in.yaml": {"value": "A2"}, "E/params.in.yaml": {"value": "E"}})
+    (tmp_path / "D" / "params.in.yaml").unlink()
+    git("add", "-A")
+    result = runner.invoke(dso_compile_config, args)
+    assert result.exit_code == 0
+    # parents are compiled as well
+    assert compiled() == [".", "A", "A/B", "E"]
+
+    # only paths within the given directories are compiled
+    for p in tmp_path.glob("**/params.yaml"):
+        p.unlink()
+    result = runner.invoke(dso_compile_config, [*args, "A/B"])
+    assert result.exit_code == 0
+    assert compiled() == [".", "A", "A/B"]
+
+    # if pyproject.toml changed, everything is compiled
+    (tmp_path / "pyproject.toml").write_text("[tool.dso]\n")
+    git("add", "-A")
+    result = runner.invoke(dso_compile_config, args)
+    assert result.exit_code == 0
+    assert compiled() == [".", "A", "A/B", "C", "E"]
+
+
+def test_path_exists_cache(tmp_path, monkeypatch):
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    (tmp_path / ".gitignore").write_text("ignored/\n")
+    for x in ["tracked.txt", "deleted.txt", "sub/untracked.txt", "ignored/ignored.txt"]:
+        (tmp_path / x).parent.mkdir(exist_ok=True)
+        (tmp_path / x).touch()
+    subprocess.run(["git", "add", "tracked.txt", "deleted.txt"], cwd=tmp_path, check=True)
+    (tmp_path / "deleted.txt").unlink()
+
+    path_exists = _PathExistsCache()
+    path_exists.add_known_files(tmp_path)
+    checked = []
+    os_path_exists = os.path.exists
+    monkeypatch.setattr(os.path, "exists", lambda p: checked.append(p) or os_path_exists(p))
+
+    # files known to git and their parent directories are not checked on the file system
+    assert path_exists(tmp_path / "tracked.txt")
+    assert path_exists(tmp_path / "sub" / ".." / "sub" / "untracked.txt")
+    assert path_exists(tmp_path / "sub")
+    assert checked == []
+    # everything else is checked once
+    assert path_exists(tmp_path / "ignored" / "ignored.txt")
+    assert not path_exists(tmp_path / "deleted.txt")
+    assert not path_exists(tmp_path / "doesnt_exist.txt")
+    assert path_exists(tmp_path / "ignored" / "ignored.txt")
+    assert not path_exists(tmp_path / "deleted.txt")
+    assert len(checked) == 3
+
+
+def test_compile_configs_incremental(tmp_path, monkeypatch):
+    """Test that configs are only recompiled if their inputs changed"""
+    (tmp_path / ".git").mkdir()
+    _setup_yaml_configs(
+        tmp_path,
+        {
+            "params.in.yaml": {"value": "root"},
+            "A/params.in.yaml": {"value": "A"},
+            "B/params.in.yaml": {"value": "B"},
+        },
+    )
+    (tmp_path / "B" / "params.in.yaml").write_text("value: B\npath: !path input.txt\n")
+
+    compiled = []
+    config_tree_compile = _ConfigTree.compile
+
+    def _compile_config(self, config):
+        compiled.append(config.parent.relative_to(tmp_path))
+        return config_tree_compile(self, config)
+
+    monkeypatch.setattr(_ConfigTree, "compile", _compile_config)
+
+    def _compile(force=False):
+        compiled.clear()
+        compile_all_configs([tmp_path], force=force)
+        return sorted(str(x) for x in compiled)
+
+    assert _compile() == [".", "A", "B"]
+    assert (tmp_path / ".dso" / "cache" / "compile.json").is_file()
+    # nothing changed
+    assert _compile() == []
+    # changing a child config only recompiles the child
+    (tmp_path / "A" / "params.in.yaml").write_text("value: A2\n")
+    assert _compile() == ["A"]
+    # changing the root config recompiles everything
+    (tmp_path / "params.in.yaml").write_text("value: root2\n")
+    assert _compile() == [".", "A", "B"]
+    # the existence of a !path changed
+    (tmp_path / "B" / "input.txt").touch()
+    assert _compile() == ["B"]
+    # the output file was modified manually or deleted
+    (tmp_path / "A" / "params.yaml").write_text("value: manual\n")
+    (tmp_path / "B" / "params.yaml").unlink()
+    assert _compile() == ["A", "B"]
+    with (tmp_path / "A" / "params.yaml").open() as f:
+        assert yaml.safe_load(f) == {"value": "A2"}
+    # force recompiles everything
+    assert _compile(force=True) == [".", "A", "B"]
+
+
+def test_compile_configs_manifest_pruning(tmp_path, monkeypatch):
+    """Removed configs are forgotten, checking only the existence of configs within the compiled directories"""
+    (tmp_path / ".git").mkdir()
+    _setup_yaml_configs(tmp_path, {"params.in.yaml": {}, "A/params.in.yaml": {}, "B/params.in.yaml": {}})
+    compile_all_configs([tmp_path])
+    (tmp_path / "A" / "params.in.yaml").unlink()
+    (tmp_path / "B" / "params.in.yaml").unlink()
+
+    checked = []
+    is_file = Path.is_file
+    monkeypatch.setattr(Path, "is_file", lambda self: checked.append(self) or is_file(self))
+    compile_all_configs([tmp_path / "A"])
+    assert tmp_path / "B" / "params.in.yaml" not in checked
+    assert sorted(_compile_config._read_compile_manifest(tmp_path)) == ["B/params.in.yaml", "params.in.yaml"]
+    compile_all_configs([tmp_path])
+    assert sorted(_compile_config._read_compile_manifest(tmp_path)) == ["params.in.yaml"]
+
+
+def test_is_config_up_to_date(tmp_path):
+    (tmp_path / ".git").mkdir()
+    _setup_yaml_configs(tmp_path, {"params.in.yaml": {"value": "root"}, "A/B/params.in.yaml": {"b": "{{ value }}"}})
+    (tmp_path / "A" / "B" / "params.in.yaml").write_text("b: '{{ value }}'\npath: !path input.txt\n")
+    config = tmp_path / "A" / "B" / "params.in.yaml"
+
+    assert not is_config_up_to_date(config, tmp_path)
+    compile_all_configs([tmp_path])
+    assert is_config_up_to_date(config, tmp_path)
+    # a parent config was added
+    _setup_yaml_configs(tmp_path, {"A/params.in.yaml": {"value": "A"}})
+    assert not is_config_up_to_date(config, tmp_path)
+    compile_all_configs([tmp_path])
+    assert is_config_up_to_date(config, tmp_path)
+    # the existence of a !path changed
+    (tmp_path / "A" / "B" / "input.txt").touch()
+    assert not is_config_up_to_date(config, tmp_path)
+    compile_all_configs([tmp_path])
+    # the output file was modified
+    (tmp_path / "A" / "B" / "params.yaml").write_text("b: manual\n")
+    assert not is_config_up_to_date(config, tmp_path)
+
+
+def test_compile_configs_parse_once(tmp_path, monkeypatch):
+    """Test that each config is parsed only once, even if it is the parent of multiple configs"""
+    (tmp_path / ".git").mkdir()
+    _setup_yaml_configs(
+        tmp_path,
+        {
+            "params.in.yaml": {"value": "root", "list": [1], "template": "{{ value }}"},
+            "A/params.in.yaml": {"value": "A", "list": [2]},
+            "A/B/params.in.yaml": {"list": [3]},
+            "A/C/params.in.yaml": {"value": "C"},
+            "D/params.in.yaml": {"other": "D"},
+        },
+    )
+    loaded = []
+
+    def _load(yaml_stream, **kwargs):
+        loaded.append(Path(yaml_stream.name).parent.relative_to(tmp_path))
+        return _load_yaml_with_auto_adjusting_paths(yaml_stream, **kwargs)
+
+    monkeypatch.setattr(_compile_config, "_load_yaml_with_auto_adjusting_paths", _load)
+    compile_all_configs([tmp_path])
+
+    assert sorted(str(x) for x in loaded) == [".", "A", "A/B", "A/C", "D"]
+    expected = {
+        "": {"value": "root", "list": [1], "template": "root"},
+        "A": {"value": "A", "list": [1, 2], "template": "A"},
+        "A/B": {"value": "A", "list": [1, 2, 3], "template": "A"},
+        "A/C": {"value": "C", "list": [1, 2], "template": "C"},
+        "D": {"value": "root", "list": [1], "template": "root", "other": "D"},
+    }
+    for stage, config in expected.items():
+        with (tmp_path / stage / "params.yaml").open() as f:
+            assert yaml.safe_load(f) == config
+
+
+@pytest.mark.parametrize(
+    "root,child",
+    [
+        ("A: 1\nB: [1, 2]\nC: {x: 1, y: [a]}\n", "B: [2, 3]\nC: {y: [b], z: null}\n"),
+        ("L: [{a: 1, b: 2}, {c: 3}]\n", "L: [{a: 5}, {d: 4}, 7]\n"),
+        ("D: {a: 1}\n", "D: [{b: 2}, {a: 3}]\n"),
+        ("S: |\n  multi\n  line\nT: '{{ S }}-x'\n", "S: other\n"),
+        ("A: 1\n---\nA: 2\nB: '{{ A }}'\n", "---\nC: '{{ B }}{{ A }}'\n"),
+        ("A: 1\nB: 2\n", ""),
+        ("", "A: 1\n"),
+        ("A: {x: 1}\n", "A: null\n"),
+    ],
+)
+def test_config_tree_matches_hiyapyco(tmp_path, root, child):
+    """The merge engine must produce the same result as hiyapyco.load"""
+    (tmp_path / ".git").mkdir()
+    (tmp_path / "A").mkdir()
+    (tmp_path / "params.in.yaml").write_text(root)
+    (tmp_path / "A" / "params.in.yaml").write_text(child)
+    configs = [tmp_path / "params.in.yaml", tmp_path / "A" / "params.in.yaml"]
+
+    expected = hiyapyco.load(
+        *[str(x) for x in configs],
+        method=hiyapyco.METHOD_MERGE,
+        none_behavior=hiyapyco.NONE_BEHAVIOR_OVERRIDE,
+        interpolate=True,
+        loader_callback=partial(
+            _load_yaml_with_auto_adjusting_paths, destination=tmp_path / "A", missing_path_warnings=set()
+        ),
+    )
+    actual, _ = _ConfigTree(configs, relative=True).compile(configs[1])
+    assert actual == ({} if expected is None else expected)
+
+
+def test_compile_configs_parallel(tmp_path, caplog):
+    """Compiling in parallel gives the same results and warns only once about each missing path"""
+    (tmp_path / ".git").mkdir()
+    configs = {"params.in.yaml": {"value": "root", "template": "{{ value }}-{{ stage }}"}}
+    for folder in ["A", "B"]:
+        configs[f"{folder}/params.in.yaml"] = {"folder": folder}
+        for stage in range(5):
+            configs[f"{folder}/{stage}/params.in.yaml"] = {"stage": stage}
+    _setup_yaml_configs(tmp_path, configs)
+    (tmp_path / "params.in.yaml").write_text(
+        (tmp_path / "params.in.yaml").read_text() + "missing: !path does_not_exist.txt\n"
+    )
+
+    compile_all_configs([tmp_path], jobs=1)
+    expected = {c: (tmp_path / c).with_name("params.yaml").read_text() for c in configs}
+    for c in configs:
+        (tmp_path / c).with_name("params.yaml").unlink()
+
+    caplog.clear()
+    compile_all_configs([tmp_path], jobs=2)
+    assert {c: (tmp_path / c).with_name("params.yaml").read_text() for c in configs} == expected
+    assert caplog.text.count("Path does_not_exist.txt in stage . does not exist") == 1
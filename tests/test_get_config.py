@@ -1,10 +1,13 @@
+import pickle
 from os import chdir
 from textwrap import dedent
 
 import pytest
+import yaml
 from click.testing import CliRunner
 
-from dso._get_config import _filter_nested_dict, get_config
+from dso import _compile_config, _yaml
+from dso._get_config import _filter_nested_dict, find_stages, get_config
 from dso.cli import dso_get_config
 
 
@@ -312,6 +315,68 @@ def test_get_config_path_relative_to_root_dir(quarto_stage):
     assert config1 == config2
 
 
+def test_get_config_cached(dso_project, monkeypatch):
+    chdir(dso_project)
+    stage = dso_project / "mystage"
+    stage.mkdir()
+    (stage / "params.in.yaml").write_text("param: 42\nratio: 0.5\n")
+    (stage / "dvc.yaml").write_text("stages:\n  mystage:\n    params:\n      - param\n")
+    assert get_config("mystage") == {"param": 42}
+    assert len(list((dso_project / ".dso" / "cache" / _yaml.YAML_CACHE_DIR).iterdir())) == 2
+
+    # the second call neither compiles the config (it is up-to-date) nor parses any YAML files
+    def _fail(*args, **kwargs):
+        raise AssertionError("Configs should not be compiled or parsed")
+
+    with monkeypatch.context() as m:
+        m.setattr(_yaml, "get_yaml", _fail)
+        m.setattr(_compile_config, "compile_all_configs", _fail)
+        config = get_config("mystage", all=True)
+    assert config["ratio"] == 0.5
+
+    # changes are picked up and replace the existing cache entry
+    (stage / "params.in.yaml").write_text("param: 43\n")
+    assert get_config("mystage") == {"param": 43}
+    assert len(list((dso_project / ".dso" / "cache" / _yaml.YAML_CACHE_DIR).iterdir())) == 2
+
+
+def test_load_yaml_cached_types(dso_project, monkeypatch):
+    """Types of the safe loader that marshal doesn't support are restored from the cache"""
+    path = dso_project / "params.yaml"
+    path.write_text(
+        dedent(
+            """\
+            date: 2002-12-14
+            datetime: 2001-12-14t21:59:43.10-05:00
+            set: !!set {x, y}
+            binary: !!binary aGVsbG8=
+            ? [1, 2]
+            : sequence key
+            1: [1.5, .inf, null, true]
+            """
+        )
+    )
+    expected = _yaml.load_yaml_cached(path, dso_project)
+    with monkeypatch.context() as m:
+        m.setattr(_yaml, "get_yaml", lambda *args: pytest.fail("YAML files should be loaded from the cache"))
+        assert _yaml.load_yaml_cached(path, dso_project) == expected
+
+
+class _Unpickled:
+    def __reduce__(self):
+        return pytest.fail, ("The cache entry was unpickled",)
+
+
+def test_load_yaml_cached_no_pickle(dso_project):
+    """Cache entries written by others are never unpickled, i.e. they can't execute code"""
+    path = dso_project / "params.yaml"
+    path.write_text("param: 42\n")
+    _yaml.load_yaml_cached(path, dso_project)
+    (entry,) = (dso_project / ".dso" / "cache" / _yaml.YAML_CACHE_DIR).iterdir()
+    entry.write_bytes(pickle.dumps(_Unpickled()))
+    assert _yaml.load_yaml_cached(path, dso_project) == {"param": 42}
+
+
 def test_get_config_invalid_stage(dso_project):
     chdir(dso_project)
     with pytest.raises(SystemExit):
@@ -324,3 +389,29 @@ def test_get_config_cli(quarto_stage):
     result = runner.invoke(dso_get_config, ["quarto_stage"])
     assert result.exit_code == 0
     assert "quarto:" in result.output
+
+
+def test_get_config_cli_multiple_stages(dso_project):
+    chdir(dso_project)
+    (dso_project / "params.in.yaml").write_text("root: 1\n")
+    for stage, dvc_stages in {"A": ["a"], "B": ["b1", "b2"], "C": []}.items():
+        (dso_project / stage).mkdir()
+        (dso_project / stage / "params.in.yaml").write_text(f"{stage}: '{{{{ root }}}}'\nother: 2\n")
+        (dso_project / stage / "dvc.yaml").write_text(
+            yaml.dump({"stages": {s: {"cmd": "true", "params": [stage]} for s in dvc_stages}})
+        )
+    assert find_stages(dso_project) == ["A", "B:b1", "B:b2"]
+
+    expected = {"A": {"A": "1"}, "B:b1": {"B": "1"}, "B:b2": {"B": "1"}}
+    runner = CliRunner()
+    result = runner.invoke(dso_get_config, ["--json", "--all-stages"])
+    assert result.exit_code == 0
+    assert yaml.safe_load(result.stdout) == expected
+    result = runner.invoke(dso_get_config, ["A", "B:b2"])
+    assert result.exit_code == 0
+    assert yaml.safe_load(result.stdout) == {"A": {"A": "1"}, "B:b2": {"B": "1"}}
+    # a single stage is printed as before
+    result = runner.invoke(dso_get_config, ["A"])
+    assert yaml.safe_load(result.stdout) == {"A": "1"}
+    assert runner.invoke(dso_get_config, []).exit_code == 1
+    assert runner.invoke(dso_get_config, ["A", "--all-stages"]).exit_code == 1
@@ -1,12 +1,16 @@
 import hashlib
 from os import chdir
+from pathlib import Path
 from shutil import copyfile
 from textwrap import dedent
+from urllib.parse import quote, unquote
 
 from click.testing import CliRunner
+from panflute import Doc, Image, Para, Str, run_filter
 
 from dso._quarto import render_quarto
 from dso.cli import dso_exec
+from dso.pandocfilter import action, finalize, prepare
 from tests.conftest import TESTDATA
 
 
@@ -126,3 +130,25 @@ def test_override_config(quarto_stage):
 
     out_html = (quarto_stage / "report" / "quarto_stage.html").read_text()
     assert "test disclaimer" not in out_html
+
+
+def test_pandocfilter_images(tmp_path):
+    """Images are watermarked concurrently after walking the document, and only once if included multiple times"""
+    copyfile(TESTDATA / "git_logo.png", tmp_path / "git logo.png")
+    copyfile(TESTDATA / "git_logo.svg", tmp_path / "git_logo.svg")
+    (tmp_path / "broken.png").write_text("not an image")
+    urls = [quote(str(tmp_path / name)) for name in ["git logo.png", "git_logo.svg", "git logo.png", "broken.png"]]
+    doc = Doc(
+        *(Para(Image(Str("figure"), url=url)) for url in urls),
+        metadata={"watermark": {"text": "WATERMARK", "tile_size": ["100"], "font_size": "12"}},
+    )
+    images = []
+    doc = run_filter(action, prepare=prepare, finalize=finalize, doc=doc)
+    doc.walk(lambda elem, doc: images.append(elem.url) if isinstance(elem, Image) else None)
+
+    assert images[0] == images[2]
+    assert all(Path(unquote(url)).parent != tmp_path for url in images[:3])
+    assert Path(unquote(images[0])).suffix == ".png"
+    assert b"dso-watermark-pattern" in Path(unquote(images[1])).read_bytes()
+    # images that can't be read keep their original URL
+    assert images[3] == urls[3]
@@ -1,11 +1,17 @@
+import os
+import stat
+
 import pytest
 
 from dso._util import (
+    _get_umask,
     _read_dot_dso_json,
     _update_dot_dso_json,
     find_in_parent,
     get_dso_config_from_pyproject_toml,
     git_list_files,
+    open_atomic,
+    write_atomic,
 )
 
 
@@ -85,3 +91,47 @@ def test_git_list_files(dso_project):
             "pyproject.toml",
         ]
     ]
+
+
+def test_write_atomic(tmp_path):
+    path = tmp_path / "file.txt"
+    write_atomic(path, b"foo")
+    assert path.read_bytes() == b"foo"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o666 & ~_get_umask()
+
+    # permissions of existing files are preserved
+    path.chmod(0o640)
+    write_atomic(path, b"bar")
+    assert path.read_bytes() == b"bar"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+    # no temporary files are left behind
+    assert list(tmp_path.iterdir()) == [path]
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="requires /proc")
+def test_get_umask(monkeypatch):
+    """The umask is read without (temporarily) modifying it, which would affect files created by other threads"""
+    old = os.umask(0o027)
+    try:
+        with monkeypatch.context() as m:
+            m.setattr(os, "umask", lambda _: pytest.fail("umask must not be modified"))
+            assert _get_umask() == 0o027
+    finally:
+        os.umask(old)
+
+
+def test_get_umask_fallback(monkeypatch):
+    """Without /proc, a fixed default is used instead of reading the umask by modifying it"""
+    monkeypatch.setattr(os, "umask", lambda _: pytest.fail("umask must not be modified"))
+    monkeypatch.setattr("dso._util.open", lambda *args: open("/nonexistent/status"), raising=False)
+    assert _get_umask() == 0o022
+
+
+def test_open_atomic_error(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"foo")
+    with pytest.raises(ValueError), open_atomic(path) as f:
+        f.write(b"bar")
+        raise ValueError
+    assert path.read_bytes() == b"foo"
+    assert list(tmp_path.iterdir()) == [path]
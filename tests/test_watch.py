@@ -0,0 +1,144 @@
+import json
+
+import pytest
+import yaml
+
+from dso import _compile_config
+from dso._compile_config import compile_all_configs
+from dso._get_config import get_config
+from dso._watch import WATCH_MARKER, ConfigWatcher, is_watched
+
+
+def _write_config(path, config: dict):
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with path.open("w") as f:
+        yaml.dump(config, f)
+
+
+def _read_params(path):
+    with (path / "params.yaml").open() as f:
+        return yaml.safe_load(f)
+
+
+@pytest.fixture
+def watched_project(tmp_path):
+    (tmp_path / ".git").mkdir()
+    _write_config(tmp_path / "params.in.yaml", {"value": 1, "root": "root"})
+    _write_config(tmp_path / "A" / "params.in.yaml", {"a": "{{ value }}"})
+    _write_config(tmp_path / "A" / "B" / "params.in.yaml", {"b": "{{ a }}"})
+    _write_config(tmp_path / "C" / "params.in.yaml", {"c": "{{ value }}"})
+    compile_all_configs([tmp_path])
+    return tmp_path
+
+
+def test_watch(watched_project, monkeypatch):
+    tmp_path = watched_project
+    loaded = []
+    load_yaml = _compile_config._load_yaml_with_auto_adjusting_paths
+
+    def _load_yaml(yaml_stream, *args, **kwargs):
+        loaded.append(yaml_stream.name)
+        return load_yaml(yaml_stream, *args, **kwargs)
+
+    monkeypatch.setattr(_compile_config, "_load_yaml_with_auto_adjusting_paths", _load_yaml)
+
+    watcher = ConfigWatcher([tmp_path], tmp_path)
+    # configs were already compiled before starting to watch
+    assert watcher.poll()
+    assert loaded == []
+    assert is_watched(tmp_path / "A", tmp_path)
+    assert not watcher.poll()
+
+    # only the modified config and its children are recompiled, only the modified config is parsed again
+    _write_config(tmp_path / "A" / "params.in.yaml", {"a": "{{ value }}{{ value }}"})
+    c_mtime = (tmp_path / "C" / "params.yaml").stat().st_mtime_ns
+    assert watcher.poll()
+    assert _read_params(tmp_path / "A" / "B")["b"] == "11"
+    assert (tmp_path / "C" / "params.yaml").stat().st_mtime_ns == c_mtime
+    assert sorted(loaded) == sorted(str(tmp_path / x / "params.in.yaml") for x in ["", "A", "A/B"])
+    loaded.clear()
+    _write_config(tmp_path / "A" / "B" / "params.in.yaml", {"b": "{{ a }}x"})
+    assert watcher.poll()
+    assert _read_params(tmp_path / "A" / "B")["b"] == "11x"
+    assert loaded == [str(tmp_path / "A" / "B" / "params.in.yaml")]
+
+    # new configs are picked up
+    _write_config(tmp_path / "D" / "params.in.yaml", {"d": "{{ root }}"})
+    assert watcher.poll()
+    assert _read_params(tmp_path / "D")["d"] == "root"
+
+    # deleted outputs are recompiled
+    (tmp_path / "C" / "params.yaml").unlink()
+    assert watcher.poll()
+    assert _read_params(tmp_path / "C")["c"] == "1"
+
+    # errors don't stop the watcher, but the configs are not considered up-to-date anymore
+    (tmp_path / "A" / "params.in.yaml").write_text("a: [")
+    assert watcher.poll()
+    assert not is_watched(tmp_path / "A", tmp_path)
+    _write_config(tmp_path / "A" / "params.in.yaml", {"a": "fixed"})
+    assert watcher.poll()
+    assert is_watched(tmp_path / "A", tmp_path)
+    assert _read_params(tmp_path / "A" / "B")["b"] == "fixedx"
+
+    watcher.remove_marker()
+    assert not is_watched(tmp_path / "A", tmp_path)
+
+
+def test_watch_path_targets(watched_project, caplog):
+    tmp_path = watched_project
+    (tmp_path / "C" / "params.in.yaml").write_text("c: !path data.csv\n")
+    watcher = ConfigWatcher([tmp_path], tmp_path)
+    watcher.poll()
+    assert "does not exist" in caplog.text
+
+    (tmp_path / "C" / "data.csv").touch()
+    caplog.clear()
+    assert watcher.poll()
+    assert "does not exist" not in caplog.text
+    assert not watcher.poll()
+
+
+@pytest.mark.parametrize(
+    "marker,expected",
+    [
+        [{}, True],
+        [{"ok": False}, False],
+        [{"heartbeat": 0}, False],
+        [{"paths": ["C"]}, False],
+        [{"dso_version": "0.0.0"}, False],
+    ],
+)
+def test_is_watched(watched_project, marker, expected):
+    tmp_path = watched_project
+    watcher = ConfigWatcher([tmp_path], tmp_path)
+    watcher.poll()
+    marker_file = tmp_path / ".dso" / "cache" / WATCH_MARKER
+    marker_file.write_text(json.dumps(json.loads(marker_file.read_text()) | marker))
+    assert is_watched(tmp_path / "A", tmp_path) == expected
+
+
+def test_get_config_skips_compile(watched_project, monkeypatch):
+    tmp_path = watched_project
+    monkeypatch.chdir(tmp_path)
+    watcher = ConfigWatcher([tmp_path], tmp_path)
+    watcher.poll()
+
+    def _compile_all_configs(*args, **kwargs):
+        raise AssertionError("Configs should not be compiled")
+
+    monkeypatch.setattr(_compile_config, "compile_all_configs", _compile_all_configs)
+    assert get_config("A/B", all=True)["b"] == "1"
+
+
+def test_get_config_compiles_changes_not_picked_up_by_watcher(watched_project, monkeypatch):
+    """Changes are never hidden by a healthy watcher that didn't poll them yet"""
+    tmp_path = watched_project
+    monkeypatch.chdir(tmp_path)
+    watcher = ConfigWatcher([tmp_path], tmp_path)
+    watcher.poll()
+    _write_config(tmp_path / "A" / "B" / "params.in.yaml", {"b": "{{ a }}x"})
+    assert is_watched(tmp_path / "A" / "B", tmp_path)
+    assert get_config("A/B", all=True)["b"] == "1x"
+    watcher.poll()
+    assert _read_params(tmp_path / "A" / "B")["b"] == "1x"
@@ -1,10 +1,17 @@
+import json
+import xml.etree.ElementTree as ET
+from io import StringIO
 from typing import Literal
+from xml.parsers.expat import ExpatError
 
 import pytest
 from click.testing import CliRunner
-from PIL import Image
+from PIL import Image, ImageChops
+from pypdf import PdfReader, PdfWriter
 
-from dso._watermark import PDFWatermarker, SVGWatermarker, Watermarker
+from dso._watermark import PDFWatermarker, PILWatermarker, SVGWatermarker, Watermarker, _render_pdf_watermark
+from dso._watermark_batch import find_batch, is_batch_input
+from dso._watermark_server import WatermarkServer
 from dso.cli import dso_watermark
 from tests.conftest import TESTDATA
 
@@ -26,11 +33,154 @@ def test_add_watermark(tmp_path, format, tile_size, image_size, font_size):
     Watermarker.add_watermark(test_image, test_image_out, text="test", tile_size=tile_size, font_size=font_size)
 
 
+def test_pil_watermark_cache():
+    wm1 = PILWatermarker("test", tile_size=[50, 50])
+    wm2 = PILWatermarker("test", tile_size=(50, 50))
+    assert wm1.get_watermark_overlay((100, 100)) is wm2.get_watermark_overlay((100, 100))
+    assert wm1._get_watermark_tile() is wm2._get_watermark_tile()
+    assert wm1.get_watermark_overlay((100, 100)) is not wm1.get_watermark_overlay((100, 101))
+    assert PILWatermarker("other", tile_size=(50, 50))._get_watermark_tile() is not wm1._get_watermark_tile()
+
+
+@pytest.mark.parametrize("tile_size", [(20, 20), (37, 50), (200, 20), (700, 500)])
+@pytest.mark.parametrize("size", [(5, 5), (613, 411), (1000, 300)])
+def test_pil_watermark_overlay(tile_size, size):
+    wm = PILWatermarker("test", tile_size=tile_size)
+    tile = wm._get_watermark_tile()
+    expected = Image.new("RGBA", size)
+    for x in range(0, size[0], tile_size[0]):
+        for y in range(0, size[1], tile_size[1]):
+            expected.paste(tile, (x, y))
+    overlay = wm.get_watermark_overlay(size)
+    assert overlay.size == size
+    assert ImageChops.difference(overlay, expected).getbbox() is None
+
+
+def test_pil_watermark_bands(tmp_path, monkeypatch):
+    """Compositing in bands gives the same result as compositing a full-size overlay"""
+    monkeypatch.setattr("dso._watermark.BAND_HEIGHT", 30)
+    test_image = tmp_path / "noise.png"
+    Image.effect_noise((300, 250), 64).convert("RGB").save(test_image)
+    wm = PILWatermarker("test", tile_size=(40, 40))
+    wm.apply_and_save(test_image, tmp_path / "out.png")
+    expected = Image.alpha_composite(Image.open(test_image).convert("RGBA"), wm.get_watermark_overlay((300, 250)))
+    assert ImageChops.difference(Image.open(tmp_path / "out.png"), expected).getbbox() is None
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "LA", "P"])
+def test_pil_watermark_streaming(tmp_path, monkeypatch, mode):
+    """Large PNG images are watermarked band by band, with the same result as watermarking them at once"""
+    test_image = tmp_path / "noise.png"
+    img = Image.merge("RGBA", [Image.effect_noise((300, 250), 64 + 16 * i) for i in range(4)])
+    img = img.quantize(64) if mode == "P" else img.convert(mode)
+    img.save(test_image, transparency=3) if mode in ("L", "P") else img.save(test_image)
+    wm = PILWatermarker("test", tile_size=(40, 40))
+    wm.apply_and_save(test_image, tmp_path / "expected.png")
+
+    monkeypatch.setattr("dso._watermark.STREAMING_MIN_PIXELS", 0)
+    monkeypatch.setattr("dso._watermark.BAND_HEIGHT", 30)
+    assert PILWatermarker._can_stream(test_image, tmp_path / "out.png")
+    wm.apply_and_save(test_image, tmp_path / "out.png")
+    out = Image.open(tmp_path / "out.png")
+    assert out.mode == "RGBA"
+    assert ImageChops.difference(out, Image.open(tmp_path / "expected.png").convert("RGBA")).getbbox() is None
+
+
+def test_pil_watermark_streaming_unsupported(tmp_path, monkeypatch):
+    """Images that can't be read in bands are watermarked at once"""
+    monkeypatch.setattr("dso._watermark.STREAMING_MIN_PIXELS", 0)
+    Image.new("I;16", (100, 100)).save(tmp_path / "16bit.png")
+    jpg = _get_test_image(tmp_path, format="jpg")
+    for path, out in [(tmp_path / "16bit.png", "a.png"), (jpg, "b.png")]:
+        assert not PILWatermarker._can_stream(path, tmp_path / out)
+        PILWatermarker("test").apply_and_save(path, tmp_path / out)
+    assert not PILWatermarker._can_stream(jpg, tmp_path / "out.jpg")
+
+
 def test_add_watermark_svg(tmp_path):
     wm = SVGWatermarker("test")
     wm.apply_and_save(TESTDATA / "git_logo.svg", tmp_path / "git_logo_watermarked.svg")
 
 
+@pytest.mark.parametrize("read_size", [64, 1 << 20])
+@pytest.mark.parametrize(
+    "svg, prefix",
+    [
+        ('<svg xmlns="http://www.w3.org/2000/svg" width="100" height="50"><circle r="5"/></svg>', ""),
+        (
+            '<?xml version="1.0"?>\n<s:svg xmlns:s="http://www.w3.org/2000/svg" viewBox="0 0 100 50">'
+            "<s:defs/><s:circle r='5'/></s:svg >\n<!-- </s:svg> -->\n<?pi?>\n",
+            "s:",
+        ),
+    ],
+)
+def test_svg_watermark_streaming(tmp_path, monkeypatch, read_size, svg, prefix):
+    """The SVG is copied unchanged, with the watermark inserted before the end tag of the root element"""
+    monkeypatch.setattr("dso._watermark.SVG_READ_SIZE", read_size)
+    (tmp_path / "in.svg").write_text(svg)
+    SVGWatermarker("test & <more>").apply_and_save(tmp_path / "in.svg", tmp_path / "out.svg")
+    out = (tmp_path / "out.svg").read_text()
+    end = svg.index(f"</{prefix}svg")
+    assert out.startswith(svg[:end] + f"<{prefix}defs><{prefix}pattern")
+    assert out.endswith(
+        f'<{prefix}rect x="0" y="0" width="100.0" height="50.0" fill="url(#dso-watermark-pattern)" />' + svg[end:]
+    )
+
+    root = ET.parse(tmp_path / "out.svg").getroot()
+    ns = "{http://www.w3.org/2000/svg}"
+    assert [t.text for t in root.iter(f"{ns}text")] == ["test & <more>"] * 2
+    assert root[-1].tag == f"{ns}rect"
+
+
+@pytest.mark.parametrize("read_size", [16, 1 << 20])
+def test_svg_watermark_self_closing_root(tmp_path, monkeypatch, read_size):
+    """A self-closing root element is expanded to contain the watermark (or falls back to the element tree)"""
+    monkeypatch.setattr("dso._watermark.SVG_READ_SIZE", read_size)
+    svg = '<!-- a comment -->\n<s:svg xmlns:s="http://www.w3.org/2000/svg" id="a/>" width="10" height="20" />\n'
+    (tmp_path / "in.svg").write_text(svg)
+    SVGWatermarker("test").apply_and_save(tmp_path / "in.svg", tmp_path / "out.svg")
+    out = (tmp_path / "out.svg").read_text()
+    if read_size > len(svg):
+        assert out.startswith(
+            '<!-- a comment -->\n<s:svg xmlns:s="http://www.w3.org/2000/svg" id="a/>" width="10" height="20" ><s:defs>'
+        )
+        assert out.endswith('fill="url(#dso-watermark-pattern)" /></s:svg>\n')
+    root = ET.fromstring(out)
+    ns = "{http://www.w3.org/2000/svg}"
+    assert [child.tag for child in root] == [f"{ns}defs", f"{ns}rect"]
+    assert root.get("id") == "a/>"
+
+
+@pytest.mark.parametrize("declaration", ['<?xml version="1.0" encoding="UTF-16"?>\n', ""])
+def test_svg_watermark_utf16(tmp_path, declaration):
+    """SVG files in encodings that are not ASCII-compatible are watermarked via the element tree"""
+    svg = declaration + '<svg xmlns="http://www.w3.org/2000/svg" width="10" height="20"><text>äö</text></svg>'
+    (tmp_path / "in.svg").write_text(svg, encoding="utf-16")
+    SVGWatermarker("test").apply_and_save(tmp_path / "in.svg", tmp_path / "out.svg")
+    root = ET.parse(tmp_path / "out.svg").getroot()
+    ns = "{http://www.w3.org/2000/svg}"
+    assert [child.tag for child in root] == [f"{ns}text", f"{ns}defs", f"{ns}rect"]
+    assert root[0].text == "äö"
+    # no temporary files are left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["in.svg", "out.svg"]
+
+
+def test_svg_watermark_in_place(tmp_path):
+    path = tmp_path / "image.svg"
+    path.write_bytes((TESTDATA / "git_logo.svg").read_bytes())
+    SVGWatermarker("test").apply_and_save(path, path)
+    assert path.read_bytes().startswith((TESTDATA / "git_logo.svg").read_bytes()[:100])
+    assert b"dso-watermark-pattern" in path.read_bytes()
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_svg_watermark_invalid(tmp_path):
+    (tmp_path / "in.svg").write_text('<svg width="10" height="10"><g></svg>')
+    with pytest.raises(ExpatError):
+        SVGWatermarker("test").apply_and_save(tmp_path / "in.svg", tmp_path / "out.svg")
+    assert not (tmp_path / "out.svg").exists()
+
+
 @pytest.mark.parametrize(
     "pdf_file",
     [
@@ -43,6 +193,45 @@ def test_add_watermark_pdf(tmp_path, pdf_file):
     wm.apply_and_save(TESTDATA / pdf_file, tmp_path / pdf_file)
 
 
+def test_pdf_watermark_cache(tmp_path, monkeypatch):
+    """The watermark PDF is only built once per page size and watermark settings"""
+    calls = []
+    create = PDFWatermarker._create_text_watermark_pdf
+    monkeypatch.setattr(
+        PDFWatermarker, "_create_text_watermark_pdf", lambda self, *size: calls.append(size) or create(self, *size)
+    )
+    _render_pdf_watermark.cache_clear()
+    writer = PdfWriter()
+    for size in [(595, 842), (842, 595), (595, 842), (595, 842)]:
+        writer.add_blank_page(*size)
+    writer.write(tmp_path / "in.pdf")
+
+    PDFWatermarker("test").apply_and_save(tmp_path / "in.pdf", tmp_path / "out1.pdf")
+    PDFWatermarker("test").apply_and_save(tmp_path / "in.pdf", tmp_path / "out2.pdf")
+    assert sorted(calls) == [(595, 842), (842, 595)]
+    PDFWatermarker("other").apply_and_save(tmp_path / "in.pdf", tmp_path / "out3.pdf")
+    assert len(calls) == 4
+
+
+def test_pdf_watermark_xobject(tmp_path):
+    """The watermark is added once per page size, as a form XObject that is drawn on top of each page"""
+    writer = PdfWriter()
+    for size in [(595, 842), (842, 595), (595, 842)]:
+        writer.add_blank_page(*size)
+    writer.write(tmp_path / "in.pdf")
+    PDFWatermarker("test").apply_and_save(tmp_path / "in.pdf", tmp_path / "out.pdf")
+
+    pages = PdfReader(tmp_path / "out.pdf").pages
+    xobjects = [page["/Resources"]["/XObject"] for page in pages]
+    assert [list(xobj) for xobj in xobjects] == [["/DSOWatermark0"], ["/DSOWatermark1"], ["/DSOWatermark0"]]
+    assert xobjects[0].raw_get("/DSOWatermark0") == xobjects[2].raw_get("/DSOWatermark0")
+    form = xobjects[1]["/DSOWatermark1"]
+    assert form["/Subtype"] == "/Form"
+    assert [float(x) for x in form["/BBox"]] == [0, 0, 842, 595]
+    assert "/P1" in form["/Resources"]["/Pattern"]
+    assert pages[1].get_contents().get_data().endswith(b"q /DSOWatermark1 Do Q\n")
+
+
 @pytest.mark.parametrize(
     "text, expected",
     [
@@ -99,3 +288,112 @@ def test_add_watermark_cli(tmp_path, params):
     result = runner.invoke(dso_watermark, [str(test_image), str(test_image_out), "--text", "test text", *params])
     assert result.exit_code == 0
     assert test_image_out.is_file()
+
+
+def test_watermark_server(tmp_path):
+    test_image = _get_test_image(tmp_path, format="png", size=(500, 500))
+    requests = [
+        {"id": 1, "input": str(test_image), "output": str(tmp_path / "out1.png")},
+        {"id": 2, "input": str(test_image), "output": str(tmp_path / "out2.png"), "font_size": 30},
+        {"id": "svg", "input": str(TESTDATA / "git_logo.svg"), "output": str(tmp_path / "out.svg")},
+        {"id": 3, "input": str(tmp_path / "missing.png"), "output": str(tmp_path / "out3.png")},
+        {"id": 4, "output": str(tmp_path / "out4.png")},
+    ]
+    server = WatermarkServer(jobs=2, text="test", tile_size=(50, 50))
+    responses = StringIO()
+    server.serve(StringIO("\n".join(json.dumps(r) for r in requests) + "\n\nnot json\n"), responses)
+
+    responses = [json.loads(line) for line in responses.getvalue().splitlines()]
+    assert {r["id"]: r["ok"] for r in responses if r["id"] is not None} == {
+        1: True,
+        2: True,
+        "svg": True,
+        3: False,
+        4: False,
+    }
+    assert [r for r in responses if r["id"] is None][0]["error"].startswith("Invalid request")
+    assert (tmp_path / "out1.png").is_file() and (tmp_path / "out2.png").is_file()
+    # instances are reused for identical options
+    assert len(server._watermarkers) == 3
+
+
+def test_watermark_server_cli(tmp_path):
+    runner = CliRunner()
+    test_image = _get_test_image(tmp_path, format="png", size=(100, 100))
+    request = {"id": 1, "input": str(test_image), "output": str(tmp_path / "out.png")}
+    result = runner.invoke(dso_watermark, ["--serve", "--text", "test"], input=json.dumps(request) + "\n")
+    assert result.exit_code == 0
+    assert json.loads(result.stdout) == {"id": 1, "ok": True}
+    assert (tmp_path / "out.png").is_file()
+
+    assert runner.invoke(dso_watermark, [str(test_image)]).exit_code == 1
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_watermark_batch_cli(tmp_path, jobs):
+    (tmp_path / "figures" / "sub").mkdir(parents=True)
+    _get_test_image(tmp_path / "figures", img_name="a", format="png")
+    _get_test_image(tmp_path / "figures" / "sub", img_name="b", format="jpg")
+    (tmp_path / "figures" / "sub" / "c.svg").write_bytes((TESTDATA / "git_logo.svg").read_bytes())
+    (tmp_path / "figures" / "notes.txt").write_text("not an image")
+    runner = CliRunner()
+
+    result = runner.invoke(
+        dso_watermark, [str(tmp_path / "figures"), str(tmp_path / "out"), "--text", "test", "-j", jobs, "--report", "-"]
+    )
+    assert result.exit_code == 0, result.output
+    assert sorted(str(p.relative_to(tmp_path / "out")) for p in (tmp_path / "out").rglob("*.*")) == [
+        "a.png",
+        "sub/b.jpg",
+        "sub/c.svg",
+    ]
+    report = [json.loads(line) for line in result.stdout.splitlines()]
+    assert len(report) == 3
+    assert all(r["ok"] and r["seconds"] >= 0 for r in report)
+
+    result = runner.invoke(
+        dso_watermark, [str(tmp_path / "figures" / "**" / "*.jpg"), str(tmp_path / "out2"), "--text", "test"]
+    )
+    assert result.exit_code == 0, result.output
+    assert [p.name for p in (tmp_path / "out2").rglob("*.*")] == ["b.jpg"]
+    assert (tmp_path / "out2" / "sub" / "b.jpg").is_file()
+
+
+def test_watermark_batch_glob_literal(tmp_path):
+    """Inputs with glob characters are only treated as a pattern if they don't exist, and must match files"""
+    test_image = _get_test_image(tmp_path, img_name="fig[1]", format="png")
+    assert not is_batch_input(str(test_image))
+    assert is_batch_input(str(tmp_path / "fig[2].png"))
+    with pytest.raises(FileNotFoundError, match="no files match"):
+        find_batch(str(tmp_path / "fig[2].png"), tmp_path / "out")
+
+    runner = CliRunner()
+    result = runner.invoke(dso_watermark, [str(test_image), str(tmp_path / "out.png"), "--text", "test"])
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "out.png").is_file()
+    result = runner.invoke(dso_watermark, [str(tmp_path / "fig[2].png"), str(tmp_path / "out"), "--text", "test"])
+    assert result.exit_code == 1
+    assert "no files match" in result.output
+
+
+def test_watermark_batch_manifest(tmp_path):
+    test_image = _get_test_image(tmp_path, format="png")
+    requests = [
+        {"input": str(test_image), "output": str(tmp_path / "out" / "1.png")},
+        {"input": str(test_image), "output": str(tmp_path / "out" / "2.png"), "text": "other"},
+        {"input": str(tmp_path / "missing.png"), "output": str(tmp_path / "out" / "3.png")},
+    ]
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text("\n".join(json.dumps(r) for r in requests) + "\n")
+    result = CliRunner().invoke(
+        dso_watermark,
+        ["--manifest", str(manifest), "--text", "test", "-j", "2", "--report", str(tmp_path / "report.jsonl")],
+    )
+    assert result.exit_code == 1
+    assert (tmp_path / "out" / "1.png").is_file() and (tmp_path / "out" / "2.png").is_file()
+    report = {r["output"]: r for r in map(json.loads, (tmp_path / "report.jsonl").read_text().splitlines())}
+    assert [report[r["output"]]["ok"] for r in requests] == [True, True, False]
+    assert "missing.png" in report[requests[2]["output"]]["error"]
+
+    manifest.write_text("not json\n")
+    assert CliRunner().invoke(dso_watermark, ["--manifest", str(manifest)]).exit_code == 1
@@ -0,0 +1,97 @@
+import os
+
+from PIL import Image
+
+from dso import _watermark_cache
+from dso._util import get_dso_config_from_pyproject_toml
+from dso._watermark_cache import WATERMARK_CACHE_DIR, add_watermark_cached
+from dso.api import WatermarkedFile
+from tests.conftest import TESTDATA
+
+
+def _cache_entries(project):
+    return sorted((project / ".dso" / "cache" / WATERMARK_CACHE_DIR).glob("*.*"))
+
+
+def test_add_watermark_cached(dso_project, monkeypatch):
+    image = dso_project / "image.png"
+    Image.new("RGB", (200, 100), color=(73, 109, 137)).save(image)
+    add_watermark_cached(image, dso_project / "out1.png", project_path=dso_project, text="test")
+    assert len(_cache_entries(dso_project)) == 1
+
+    # the cached image is used, even with equivalent settings specified differently
+    calls = []
+    monkeypatch.setattr("dso._watermark.Watermarker.add_watermark", lambda *args, **kwargs: calls.append(args))
+    add_watermark_cached(image, dso_project / "out2.png", project_path=dso_project, text="test", tile_size=[200, 200])
+    assert not calls
+    assert (dso_project / "out2.png").read_bytes() == (dso_project / "out1.png").read_bytes()
+
+    # different settings, content or output format are watermarked again
+    add_watermark_cached(image, dso_project / "out3.png", project_path=dso_project, text="other")
+    add_watermark_cached(image, dso_project / "out4.jpg", project_path=dso_project, text="test")
+    Image.new("RGB", (200, 100), color=(0, 0, 0)).save(image)
+    add_watermark_cached(image, dso_project / "out5.png", project_path=dso_project, text="test")
+    assert len(calls) == 3
+
+
+def test_add_watermark_cached_no_project(tmp_path):
+    svg = TESTDATA / "git_logo.svg"
+    add_watermark_cached(svg, tmp_path / "out.svg", project_path=tmp_path, text="test")
+    assert b"dso-watermark-pattern" in (tmp_path / "out.svg").read_bytes()
+    assert not (tmp_path / ".dso").exists()
+
+
+def test_add_watermark_cached_disabled(dso_project):
+    (dso_project / "pyproject.toml").write_text("[tool.dso]\nwatermark_cache_size = 0\n")
+    get_dso_config_from_pyproject_toml.cache_clear()
+    add_watermark_cached(TESTDATA / "git_logo.svg", dso_project / "out.svg", project_path=dso_project, text="test")
+    assert (dso_project / "out.svg").is_file()
+    assert not _cache_entries(dso_project)
+
+
+def test_add_watermark_cached_eviction(dso_project, monkeypatch):
+    """The least recently used entries are deleted once the cache exceeds its maximum size"""
+    monkeypatch.setattr(
+        "dso._watermark_cache.get_dso_config_from_pyproject_toml", lambda _: {"watermark_cache_size": 0.5}
+    )
+    images = []
+    for i in range(3):
+        images.append(dso_project / f"image{i}.png")
+        Image.effect_noise((400, 400), 10 + i).convert("RGB").save(images[-1])
+    add_watermark_cached(images[0], dso_project / "out0.png", project_path=dso_project, text="test")
+    add_watermark_cached(images[1], dso_project / "out1.png", project_path=dso_project, text="test")
+    entries = _cache_entries(dso_project)
+    assert len(entries) == 2
+    # mark the first entry as less recently used, then use it
+    for i, entry in enumerate(entries):
+        os.utime(entry, (1000 + i, 1000 + i))
+    first = next(e for e in entries if e.read_bytes() == (dso_project / "out0.png").read_bytes())
+    add_watermark_cached(images[0], dso_project / "out0.png", project_path=dso_project, text="test")
+
+    add_watermark_cached(images[2], dso_project / "out2.png", project_path=dso_project, text="test")
+    remaining = _cache_entries(dso_project)
+    assert first in remaining
+    assert sum(e.stat().st_size for e in remaining) <= 0.5 * 1024**2
+    assert len(remaining) < 3
+
+
+def test_watermarked_file_cached(dso_project):
+    output_file = dso_project / "output.png"
+    for _ in range(2):
+        with WatermarkedFile(output_file, text="DRAFT") as f:
+            Image.new("RGB", (100, 100), color=(73, 109, 137)).save(f)
+    assert output_file.is_file()
+    assert len(_cache_entries(dso_project)) == 1
+
+
+def test_add_watermark_cached_lists_cache_once(dso_project, monkeypatch):
+    """The cache directory is not listed after every store, as long as the cache is below its maximum size"""
+    listed = []
+    list_entries = _watermark_cache._list_entries
+    monkeypatch.setattr(_watermark_cache, "_list_entries", lambda d: listed.append(d) or list_entries(d))
+    for i in range(5):
+        image = dso_project / f"image{i}.png"
+        Image.new("RGB", (50, 50), color=(i, 0, 0)).save(image)
+        add_watermark_cached(image, dso_project / f"out{i}.png", project_path=dso_project, text="test")
+    assert len(_cache_entries(dso_project)) == 5
+    assert len(listed) == 1